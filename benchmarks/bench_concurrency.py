@@ -0,0 +1,95 @@
+"""Проверка параллельного доступа нескольких процессов к одной базе
+
+Запускает несколько процессов-читателей и один процесс-писатель на общей
+базе и выводит число операций и ошибок блокировки в каждом процессе.
+
+Запуск: python -m benchmarks.bench_concurrency [читателей] [секунд]
+"""
+
+import multiprocessing
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from cryptography.fernet import Fernet
+
+from core.crypto import crypto_manager
+from core.database import DatabaseManager
+
+ROWS = 5_000
+
+
+def _reader(db_path: Path, key: bytes, duration: float, results) -> None:
+    """Читать записи до истечения времени"""
+    crypto_manager.decrypted_key = key
+    manager = DatabaseManager(db_path)
+    ops = errors = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        try:
+            manager.get_credential(f"service-{ops % ROWS:05d}")
+            manager.search_credentials("service-00")
+            ops += 1
+        except sqlite3.OperationalError:
+            errors += 1
+    manager.close()
+    results.put(("reader", ops, errors))
+
+
+def _writer(db_path: Path, key: bytes, duration: float, results) -> None:
+    """Добавлять и удалять записи до истечения времени"""
+    crypto_manager.decrypted_key = key
+    manager = DatabaseManager(db_path)
+    ops = errors = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        try:
+            service = f"writer-{ops}"
+            manager.save_credential(service, "writer", "password")
+            credential_id = manager.get_credential(service)[0]
+            manager.delete_credential(credential_id)
+            ops += 1
+        except sqlite3.OperationalError:
+            errors += 1
+    manager.close()
+    results.put(("writer", ops, errors))
+
+
+def main():
+    """Запустить читателей и писателя одновременно"""
+    readers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    key = Fernet.generate_key()
+    crypto_manager.decrypted_key = key
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        manager = DatabaseManager(db_path)
+        manager.save_credentials_many((f"service-{i:05d}", f"user{i}", "password", "") for i in range(ROWS))
+        manager.close()
+
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=_reader, args=(db_path, key, duration, results))
+            for _ in range(readers)
+        ]
+        processes.append(multiprocessing.Process(target=_writer, args=(db_path, key, duration, results)))
+        for process in processes:
+            process.start()
+
+        total_errors = 0
+        for _ in processes:
+            role, ops, errors = results.get()
+            total_errors += errors
+            print(f"{role:<8} операций: {ops:8d}  ошибок блокировки: {errors}")
+        for process in processes:
+            process.join()
+
+        print("OK" if total_errors == 0 else f"Ошибок блокировки: {total_errors}")
+        sys.exit(1 if total_errors else 0)
+
+
+if __name__ == "__main__":
+    main()
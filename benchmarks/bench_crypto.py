@@ -0,0 +1,47 @@
+"""Микробенчмарки шифрования записей в CryptoManager
+
+Запуск: python -m benchmarks.bench_crypto [количество паролей]
+"""
+
+import sys
+import time
+
+from cryptography.fernet import Fernet
+
+from core.crypto import crypto_manager
+
+
+def _measure(label: str, func, count: int) -> None:
+    """Выполнить функцию и вывести время на один пароль"""
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<44} {elapsed / count * 1e6:8.2f} мкс/пароль")
+
+
+def main():
+    """Сравнить поштучное и пакетное шифрование"""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    key = Fernet.generate_key()
+    crypto_manager.decrypted_key = key
+    passwords = [f"password-{i:08d}" for i in range(count)]
+    tokens = crypto_manager.encrypt_many(passwords)
+
+    legacy_tokens = [Fernet(key).encrypt(p.encode()) for p in passwords]
+
+    print(f"Паролей: {count}")
+    print(f"Размер записи: Fernet {len(legacy_tokens[0])} байт, AES-GCM {len(tokens[0])} байт")
+    _measure("encrypt: новый Fernet на каждый вызов",
+             lambda: [Fernet(key).encrypt(p.encode()) for p in passwords], count)
+    _measure("encrypt_password: общий шифр сессии",
+             lambda: [crypto_manager.encrypt_password(p) for p in passwords], count)
+    _measure("encrypt_many", lambda: crypto_manager.encrypt_many(passwords), count)
+    _measure("encrypt_many(parallel=True)", lambda: crypto_manager.encrypt_many(passwords, parallel=True), count)
+    _measure("decrypt: новый Fernet на каждый вызов",
+             lambda: [Fernet(key).decrypt(t) for t in legacy_tokens], count)
+    _measure("decrypt_many: записи Fernet", lambda: crypto_manager.decrypt_many(legacy_tokens), count)
+    _measure("decrypt_many: записи AES-GCM", lambda: crypto_manager.decrypt_many(tokens), count)
+    _measure("decrypt_many(parallel=True)", lambda: crypto_manager.decrypt_many(tokens, parallel=True), count)
+
+if __name__ == "__main__":
+    main()
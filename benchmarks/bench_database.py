@@ -0,0 +1,71 @@
+"""Замер задержки операций DatabaseManager
+
+Запуск: python -m benchmarks.bench_database [количество записей]
+"""
+
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from cryptography.fernet import Fernet
+
+from core.crypto import crypto_manager
+from core.database import DatabaseManager
+
+
+def _measure(label: str, func, calls: int) -> None:
+    """Выполнить функцию calls раз и вывести среднюю задержку"""
+    start = time.perf_counter()
+    for i in range(calls):
+        func(i)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed / calls * 1e6:10.1f} мкс/вызов")
+
+
+def main():
+    """Сравнить соединение на каждый вызов и постоянное соединение"""
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    calls = 2_000
+    crypto_manager.decrypted_key = Fernet.generate_key()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        manager = DatabaseManager(db_path)
+        token = crypto_manager.encrypt_password("benchmark-password")
+        with manager.connection as conn:
+            conn.executemany(
+                "INSERT INTO credentials (service, login, encrypted_password, comment) VALUES (?, ?, ?, ?)",
+                ((f"service-{i:07d}", f"user{i}", token, "") for i in range(rows))
+            )
+
+        def lookup_per_call(i):
+            with sqlite3.connect(db_path) as conn:
+                conn.execute("SELECT id FROM credentials WHERE service = ?", (f"service-{i % rows:07d}",)).fetchone()
+
+        def lookup_pooled(i):
+            manager.service_exists(f"service-{i % rows:07d}")
+
+        def get_per_call(i):
+            with sqlite3.connect(db_path) as conn:
+                row = conn.execute(
+                    "SELECT id, login, encrypted_password, comment FROM credentials WHERE service = ?",
+                    (f"service-{i % rows:07d}",)
+                ).fetchone()
+                crypto_manager.decrypt_password(row[2])
+
+        def get_pooled(i):
+            manager.get_credential(f"service-{i % rows:07d}")
+
+        print(f"Записей в базе: {rows}, вызовов: {calls}")
+        _measure("service_exists: соединение на вызов", lookup_per_call, calls)
+        _measure("service_exists: постоянное соединение", lookup_pooled, calls)
+        _measure("get_credential: соединение на вызов", get_per_call, calls)
+        _measure("get_credential: постоянное соединение", get_pooled, calls)
+
+        manager.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Замер нечеткого поиска по индексу в памяти
+
+Запуск: python -m benchmarks.bench_fuzzy [количество записей]
+"""
+
+import random
+import sys
+import time
+
+from config.settings import APP_CONFIG
+from core.fuzzy_index import FuzzyIndex
+
+QUERIES = ["gh prod", "github", "githb", "gh", "g", "paypl", "amazon admin", "zzz"]
+
+
+def _word(rng: random.Random) -> str:
+    """Случайное произносимое слово"""
+    return "".join(rng.choice("bcdfghklmnprstvz") + rng.choice("aeiou") for _ in range(rng.randint(2, 4)))
+
+
+def main():
+    """Построить индекс на синтетических записях и замерить запросы"""
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    calls = 50
+    limit = APP_CONFIG["SEARCH_RESULT_LIMIT"]
+    rng = random.Random(1)
+    brands = [_word(rng) for _ in range(rows // 5)] + ["github", "gitlab", "google", "paypal", "amazon"]
+    envs = ["", "prod", "staging", "dev", "admin"]
+    records = [
+        (i, f"{rng.choice(brands).capitalize()} {rng.choice(envs)}".strip(),
+         f"{_word(rng)}.{_word(rng)}@{rng.choice(brands)}.com")
+        for i in range(1, rows + 1)
+    ]
+    records.append((rows + 1, "GitHub Prod", "ops@corp"))
+
+    start = time.perf_counter()
+    index = FuzzyIndex(records, APP_CONFIG["FUZZY_CANDIDATE_LIMIT"])
+    print(f"Записей: {len(index)}, построение индекса: {time.perf_counter() - start:.2f} с")
+
+    for query in QUERIES:
+        start = time.perf_counter()
+        for _ in range(calls):
+            results = index.search(query, limit)
+        elapsed = (time.perf_counter() - start) / calls
+        top = results[0][0] if results else "-"
+        print(f"{query!r:<16} {elapsed * 1e3:8.2f} мс  найдено {len(results):>4}  первый: {top}")
+
+
+if __name__ == "__main__":
+    main()
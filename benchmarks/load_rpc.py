@@ -0,0 +1,123 @@
+"""Нагрузочный тест JSON-RPC сервера
+
+Поднимает сервер на временной базе в отдельном процессе (или подключается
+к уже запущенному через --socket и --token) и гоняет запросы из множества
+параллельных соединений. Выводит число запросов в секунду и перцентили
+задержки для одиночных get и для get_many.
+
+Запуск: python -m benchmarks.load_rpc [--clients 50] [--seconds 5] [--batch 20]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+ROWS = 10_000
+
+
+def _serve(db_path: Path, socket_path: Path, token: str, ready) -> None:
+    """Процесс сервера: временная база с ROWS записями"""
+    from cryptography.fernet import Fernet
+
+    from core.crypto import crypto_manager
+    from core.database import DatabaseManager
+    from core.rpc_server import RpcServer
+
+    crypto_manager.decrypted_key = Fernet.generate_key()
+    manager = DatabaseManager(db_path)
+    manager.save_credentials_many((f"service-{i:05d}", f"user{i}", f"password-{i}", "") for i in range(ROWS))
+
+    async def run() -> None:
+        # Лимит частоты не должен искажать замер пропускной способности
+        server = RpcServer(token, db=manager, rate_limit=1e9, rate_burst=1e9)
+        await server.start_unix(socket_path)
+        ready.set()
+        await server.serve_forever()
+
+    asyncio.run(run())
+
+
+async def _client(socket_path: str, token: str, deadline: float, batch: int,
+                  client_id: int, latencies: List[float]) -> None:
+    """Одно постоянное соединение, запросы последовательно до истечения времени"""
+    reader, writer = await asyncio.open_unix_connection(socket_path, limit=1 << 20)
+
+    async def call(method: str, params: dict) -> dict:
+        writer.write(json.dumps({"jsonrpc": "2.0", "id": 1, "method": method, "params": params}).encode() + b"\n")
+        await writer.drain()
+        response = json.loads(await reader.readline())
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response["result"]
+
+    await call("auth", {"token": token})
+    i = client_id * 7919
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        if batch > 1:
+            services = [f"service-{(i + k) % ROWS:05d}" for k in range(batch)]
+            await call("get_many", {"services": services})
+        else:
+            await call("get", {"service": f"service-{i % ROWS:05d}"})
+        latencies.append(time.perf_counter() - start)
+        i += batch
+    writer.close()
+
+
+async def _run_load(socket_path: str, token: str, clients: int, seconds: float, batch: int) -> Tuple[int, List[float]]:
+    """Запустить клиентов и собрать задержки"""
+    latencies: List[float] = []
+    deadline = time.monotonic() + seconds
+    await asyncio.gather(*(_client(socket_path, token, deadline, batch, n, latencies) for n in range(clients)))
+    return len(latencies), sorted(latencies)
+
+
+def _report(label: str, calls: int, latencies: List[float], seconds: float, batch: int) -> None:
+    """Вывести пропускную способность и перцентили"""
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    print(f"{label:<22} {calls / seconds:10.0f} вызовов/с {calls * batch / seconds:10.0f} секретов/с"
+          f"   p50 {percentile(0.50):6.2f} мс   p99 {percentile(0.99):6.2f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--batch", type=int, default=20)
+    parser.add_argument("--socket", help="сокет запущенного сервера")
+    parser.add_argument("--token", help="токен запущенного сервера")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        process = None
+        socket_path, token = args.socket, args.token
+        if socket_path is None:
+            socket_path, token = str(Path(tmp) / "rpc.sock"), "load-test"
+            ready = multiprocessing.Event()
+            process = multiprocessing.Process(
+                target=_serve, args=(Path(tmp) / "load.db", Path(socket_path), token, ready), daemon=True
+            )
+            process.start()
+            if not ready.wait(120):
+                raise SystemExit("Сервер не запустился")
+
+        try:
+            print(f"Клиентов: {args.clients}, секунд на замер: {args.seconds}")
+            for label, batch in (("get", 1), (f"get_many x{args.batch}", args.batch)):
+                calls, latencies = asyncio.run(_run_load(socket_path, token, args.clients, args.seconds, batch))
+                _report(label, calls, latencies, args.seconds, batch)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Нагрузочная проверка потокобезопасности CryptoManager и DatabaseManager
+
+Много потоков одновременно читают, ищут, изменяют и удаляют записи одного
+DatabaseManager, а отдельный поток непрерывно блокирует и снова открывает
+сессию. Проверяется, что:
+- чтение никогда не возвращает пароль другой записи или смесь версий;
+- после блокировки в кэше не остается расшифрованных записей;
+- кроме ожидаемой ошибки "хранилище заблокировано" исключений нет;
+- после нагрузки кэш совпадает с содержимым базы.
+
+Запуск: python -m benchmarks.stress_threads [потоков] [секунд]
+"""
+
+import random
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from collections import Counter
+from pathlib import Path
+
+from cryptography.fernet import Fernet
+
+from core.crypto import crypto_manager
+from core.database import DatabaseManager
+
+ROWS = 2_000
+LOCKED_MESSAGE = "Ключ шифрования не загружен"
+
+
+def _worker(manager: DatabaseManager, seed: int, deadline: float, stats: Counter, failures: list) -> None:
+    """Случайные операции чтения и записи до истечения времени"""
+    rng = random.Random(seed)
+    while time.monotonic() < deadline:
+        service = f"service-{rng.randrange(ROWS):05d}"
+        op = rng.random()
+        try:
+            if op < 0.55:
+                credential = manager.get_credential(service)
+                if credential is not None and not credential[2].startswith(service + ":"):
+                    failures.append(f"{service}: чужой пароль {credential[2]!r}")
+                stats["get"] += 1
+            elif op < 0.70:
+                manager.search_credentials(service[:-1])
+                stats["search"] += 1
+            elif op < 0.80:
+                list(manager.iter_credentials(service, page_size=50))
+                stats["list"] += 1
+            elif op < 0.95:
+                credential = manager.get_credential(service)
+                if credential is not None:
+                    manager.save_credential(service, credential[1], f"{service}:{rng.random()}",
+                                            credential[3], credential[0])
+                stats["update"] += 1
+            else:
+                temp = f"temp-{seed}-{rng.randrange(1 << 30)}"
+                manager.save_credential(temp, "temp", f"{temp}:0")
+                manager.delete_credential(manager.get_credential(temp)[0])
+                stats["insert+delete"] += 1
+        except RuntimeError as e:
+            if LOCKED_MESSAGE not in str(e):
+                failures.append(traceback.format_exc())
+            stats["locked"] += 1
+        except Exception:
+            failures.append(traceback.format_exc())
+
+
+def _locker(manager: DatabaseManager, key: bytes, deadline: float, stats: Counter, failures: list) -> None:
+    """Блокировать и открывать сессию, проверяя очистку кэша"""
+    while time.monotonic() < deadline:
+        time.sleep(0.005)
+        crypto_manager.lock()
+        time.sleep(0.002)
+        leftover = len(manager._secret_cache._entries)
+        if leftover:
+            failures.append(f"после блокировки в кэше осталось записей: {leftover}")
+        crypto_manager.decrypted_key = key
+        stats["lock cycles"] += 1
+
+
+def main():
+    threads_count = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    key = Fernet.generate_key()
+    crypto_manager.decrypted_key = key
+
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = DatabaseManager(Path(tmp) / "stress.db")
+        manager.save_credentials_many(
+            (f"service-{i:05d}", f"user{i}", f"service-{i:05d}:0", "") for i in range(ROWS)
+        )
+
+        stats: Counter = Counter()
+        failures: list = []
+        deadline = time.monotonic() + duration
+        threads = [threading.Thread(target=_worker, args=(manager, n, deadline, stats, failures))
+                   for n in range(threads_count)]
+        threads.append(threading.Thread(target=_locker, args=(manager, key, deadline, stats, failures)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Кэш должен совпадать с базой
+        crypto_manager.decrypted_key = key
+        for i in range(ROWS):
+            service = f"service-{i:05d}"
+            cached = manager.get_credential(service)
+            row = manager.connection.execute(
+                "SELECT encrypted_password FROM credentials WHERE service = ?", (service,)
+            ).fetchone()
+            if cached[2] != crypto_manager.decrypt_password(row[0]):
+                failures.append(f"{service}: кэш расходится с базой")
+
+        manager.close()
+
+    print(f"Потоков: {threads_count}, секунд: {duration}")
+    for name, count in sorted(stats.items()):
+        print(f"  {name:<15} {count:>10}")
+    if failures:
+        print(f"Ошибок: {len(failures)}")
+        for failure in failures[:10]:
+            print(failure)
+        sys.exit(1)
+    print("Ошибок не обнаружено")
+
+
+if __name__ == "__main__":
+    main()
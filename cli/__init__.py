@@ -0,0 +1 @@
+"""Консольный интерфейс Digital Fortress (без графического интерфейса)"""
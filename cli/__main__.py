@@ -0,0 +1,375 @@
+"""Консольный интерфейс хранилища
+
+Запуск: python -m cli <команда> [аргументы]
+
+Команды: get, put, list, search, import, export, rotate, agent, serve.
+
+Модуль никогда не импортирует Tk: тяжелые зависимости (криптография,
+база данных, импорт и экспорт) загружаются только той командой, которой
+они нужны, поэтому время запуска уходит на вычисление ключа, а не на импорты.
+
+Мастер-пароль берется из переменной окружения FORTRESS_MASTER_PASSWORD,
+иначе запрашивается в терминале или читается первой строкой stdin.
+Если запущен агент разблокировки (python -m cli agent start), команды
+get, put, list и search выполняются через него без ввода мастер-пароля.
+"""
+
+import argparse
+import os
+import sys
+from typing import List, Optional
+
+# Коды завершения
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_NOT_FOUND = 3
+EXIT_AUTH = 4
+
+MASTER_PASSWORD_ENV = "FORTRESS_MASTER_PASSWORD"
+
+
+class CliError(Exception):
+    """Ошибка выполнения команды с кодом завершения"""
+
+    def __init__(self, message: str, code: int = EXIT_ERROR):
+        super().__init__(message)
+        self.code = code
+
+
+def _read_secret(prompt: str) -> str:
+    """Прочитать секрет из терминала без эха или строкой из stdin"""
+    if sys.stdin.isatty():
+        import getpass
+        return getpass.getpass(prompt)
+    line = sys.stdin.readline()
+    if not line:
+        raise CliError("Не удалось прочитать секрет: stdin закрыт")
+    return line.rstrip("\r\n")
+
+
+def _unlock() -> None:
+    """Разблокировать хранилище мастер-паролем"""
+    from config.settings import KDF_PATH
+    from core.crypto import crypto_manager
+
+    if not KDF_PATH.exists():
+        raise CliError(f"Хранилище не найдено: {KDF_PATH}")
+
+    password = os.environ.get(MASTER_PASSWORD_ENV)
+    if password is None:
+        password = _read_secret("Мастер-пароль: ")
+    if not crypto_manager.verify_password(password):
+        raise CliError("Неверный мастер-пароль", EXIT_AUTH)
+
+
+def _agent(args: argparse.Namespace):
+    """Клиент запущенного агента разблокировки или None"""
+    if args.no_agent:
+        return None
+    from core.agent import connect_agent
+    return connect_agent()
+
+
+def _request(agent, op: str, **params):
+    """Выполнить запрос к агенту, превращая ошибки агента в ошибки команды"""
+    from core.agent import AgentError
+    try:
+        return agent.request(op, **params)
+    except AgentError as e:
+        raise CliError(str(e))
+
+
+def cmd_get(args: argparse.Namespace) -> int:
+    """Вывести пароль (или другое поле) записи"""
+    agent = _agent(args)
+    if agent is not None:
+        credential = _request(agent, "get", service=args.service)
+    else:
+        _unlock()
+        from core.database import db_manager
+        credential = db_manager.get_credential(args.service)
+
+    if credential is None:
+        raise CliError(f"Сервис не найден: {args.service}", EXIT_NOT_FOUND)
+
+    _, login, password, comment = credential
+    fields = {"password": password, "login": login, "comment": comment}
+    if args.field == "all":
+        for name in ("login", "password", "comment"):
+            print(f"{name}\t{fields[name]}")
+    else:
+        print(fields[args.field])
+    return EXIT_OK
+
+
+def cmd_put(args: argparse.Namespace) -> int:
+    """Создать или обновить запись"""
+    agent = _agent(args)
+    if agent is not None:
+        get = lambda service: _request(agent, "get", service=service)
+        save = lambda *values: _request(agent, "put", service=values[0], login=values[1], password=values[2],
+                                        comment=values[3], credential_id=values[4])
+    else:
+        _unlock()
+        from core.database import db_manager
+        get, save = db_manager.get_credential, db_manager.save_credential
+
+    password = _read_secret(f"Пароль для {args.service}: ")
+    if not password:
+        raise CliError("Пароль не может быть пустым")
+
+    existing = get(args.service)
+    if existing is not None:
+        credential_id, login, _, comment = existing
+        save(
+            args.service,
+            args.login if args.login is not None else login,
+            password,
+            args.comment if args.comment is not None else comment,
+            credential_id,
+        )
+    else:
+        save(args.service, args.login or "", password, args.comment or "", None)
+    return EXIT_OK
+
+
+def _print_rows(rows) -> None:
+    """Вывести пары (service, login) через табуляцию"""
+    write = sys.stdout.write
+    for service, login in rows:
+        write(f"{service}\t{login}\n")
+
+
+def cmd_list(args: argparse.Namespace) -> int:
+    """Вывести сервисы и логины в алфавитном порядке"""
+    agent = _agent(args)
+    if agent is not None:
+        _print_rows(_request(agent, "list", after=args.after, limit=args.limit))
+        return EXIT_OK
+
+    _unlock()
+    from itertools import islice
+    from core.database import db_manager
+
+    rows = db_manager.iter_credentials(args.after)
+    _print_rows(islice(rows, args.limit) if args.limit else rows)
+    return EXIT_OK
+
+
+def cmd_search(args: argparse.Namespace) -> int:
+    """Найти записи по подстрокам в сервисе или логине"""
+    agent = _agent(args)
+    if agent is not None:
+        rows = _request(agent, "search", query=args.query, limit=args.limit)
+    else:
+        _unlock()
+        from core.database import db_manager
+        rows = db_manager.search_credentials(args.query, args.limit)
+    if not rows:
+        return EXIT_NOT_FOUND
+    _print_rows(rows)
+    return EXIT_OK
+
+
+def cmd_import(args: argparse.Namespace) -> int:
+    """Импортировать записи из CSV или JSON Lines"""
+    _unlock()
+    from core.importer import import_file
+
+    result = import_file(args.path, args.format)
+    print(f"Импортировано: {result.imported}, дубликатов: {result.duplicates}, "
+          f"пропущено: {result.skipped}", file=sys.stderr)
+    if result.malformed:
+        lines = ", ".join(map(str, result.malformed[:10])) + (" ..." if len(result.malformed) > 10 else "")
+        print(f"Не удалось разобрать строк: {len(result.malformed)} ({lines})", file=sys.stderr)
+    return EXIT_OK
+
+
+def cmd_export(args: argparse.Namespace) -> int:
+    """Выгрузить хранилище в зашифрованный архив"""
+    _unlock()
+    from core.export import export_vault
+
+    rows = export_vault(args.path)
+    print(f"Выгружено записей: {rows}", file=sys.stderr)
+    return EXIT_OK
+
+
+def cmd_rotate(args: argparse.Namespace) -> int:
+    """Сменить ключ данных и перешифровать все записи"""
+    # Агент держит старый ключ и после ротации шифровал бы им новые записи
+    agent = _agent(args)
+    if agent is not None:
+        _request(agent, "lock")
+
+    from core.rotation import rotate_data_key
+
+    password = os.environ.get(MASTER_PASSWORD_ENV)
+    if password is None:
+        password = _read_secret("Мастер-пароль: ")
+
+    def progress(done: int, total: int) -> None:
+        print(f"\rПерешифровано {done}/{total}", end="", file=sys.stderr, flush=True)
+
+    try:
+        count = rotate_data_key(password, progress if sys.stderr.isatty() else None)
+    except ValueError as e:
+        raise CliError(str(e), EXIT_AUTH)
+    print(f"\rКлюч данных заменен, записей: {count}", file=sys.stderr)
+    return EXIT_OK
+
+
+def cmd_agent(args: argparse.Namespace) -> int:
+    """Управление агентом разблокировки"""
+    from config.settings import AGENT_SOCKET_PATH
+    from core.agent import AgentError, connect_agent
+
+    agent = connect_agent()
+    if args.action == "status":
+        print(f"Агент запущен: {AGENT_SOCKET_PATH}" if agent else "Агент не запущен")
+        return EXIT_OK if agent else EXIT_NOT_FOUND
+    if args.action == "lock":
+        if agent is None:
+            raise CliError("Агент не запущен", EXIT_NOT_FOUND)
+        _request(agent, "lock")
+        return EXIT_OK
+
+    from core.agent import AgentServer, disable_core_dumps
+
+    if agent is not None:
+        raise CliError(f"Агент уже запущен: {AGENT_SOCKET_PATH}")
+    _unlock()
+    server = AgentServer(idle_timeout=args.timeout)
+    try:
+        server.bind()
+    except (AgentError, OSError) as e:
+        raise CliError(f"Не удалось запустить агента: {e}")
+
+    if args.foreground or not hasattr(os, "fork"):
+        disable_core_dumps()
+        print(f"Агент запущен: {AGENT_SOCKET_PATH}", file=sys.stderr)
+        server.serve_forever()
+        return EXIT_OK
+
+    pid = os.fork()
+    if pid:
+        server.detach()
+        print(f"Агент запущен (pid {pid}): {AGENT_SOCKET_PATH}", file=sys.stderr)
+        return EXIT_OK
+
+    # Дочерний процесс: отделяемся от терминала и обслуживаем клиентов
+    try:
+        os.setsid()
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        disable_core_dumps()
+        server.serve_forever()
+    finally:
+        os._exit(0)
+
+
+def cmd_serve(args: argparse.Namespace) -> int:
+    """Запустить локальный JSON-RPC сервер"""
+    import asyncio
+    from config.settings import RPC_SOCKET_PATH, RPC_TOKEN_PATH
+    from core.rpc_server import RpcServer, is_loopback, load_or_create_token
+
+    if args.tcp:
+        host, _, port = args.tcp.rpartition(":")
+        host = host.strip("[]") or "127.0.0.1"
+        if not is_loopback(host) or not port.isdigit():
+            raise CliError(f"Ожидается loopback-адрес HOST:PORT: {args.tcp}")
+
+    _unlock()
+    server = RpcServer(load_or_create_token(RPC_TOKEN_PATH))
+
+    async def run() -> None:
+        if args.tcp:
+            bound = await server.start_tcp(host, int(port))
+            address = f"{host}:{bound}"
+        else:
+            await server.start_unix(args.socket or RPC_SOCKET_PATH)
+            address = str(args.socket or RPC_SOCKET_PATH)
+        print(f"JSON-RPC сервер: {address}, токен: {RPC_TOKEN_PATH}", file=sys.stderr)
+        await server.serve_forever()
+
+    asyncio.run(run())
+    return EXIT_OK
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Описание команд и аргументов"""
+    parser = argparse.ArgumentParser(prog="python -m cli", description="Digital Fortress - менеджер паролей")
+    parser.add_argument("--no-agent", action="store_true", help="не использовать агента разблокировки")
+    commands = parser.add_subparsers(dest="command", required=True, metavar="команда")
+
+    get = commands.add_parser("get", help="вывести пароль записи")
+    get.add_argument("service")
+    get.add_argument("--field", choices=("password", "login", "comment", "all"), default="password")
+    get.set_defaults(handler=cmd_get)
+
+    put = commands.add_parser("put", help="создать или обновить запись (пароль читается из stdin)")
+    put.add_argument("service")
+    put.add_argument("--login")
+    put.add_argument("--comment")
+    put.set_defaults(handler=cmd_put)
+
+    list_ = commands.add_parser("list", help="список сервисов и логинов")
+    list_.add_argument("--after", help="начать после указанного сервиса")
+    list_.add_argument("--limit", type=int)
+    list_.set_defaults(handler=cmd_list)
+
+    search = commands.add_parser("search", help="поиск по сервису и логину")
+    search.add_argument("query")
+    search.add_argument("--limit", type=int)
+    search.set_defaults(handler=cmd_search)
+
+    import_ = commands.add_parser("import", help="импорт из CSV или JSON Lines")
+    import_.add_argument("path")
+    import_.add_argument("--format", choices=("csv", "jsonl"))
+    import_.set_defaults(handler=cmd_import)
+
+    export = commands.add_parser("export", help="экспорт в зашифрованный архив")
+    export.add_argument("path")
+    export.set_defaults(handler=cmd_export)
+
+    rotate = commands.add_parser("rotate", help="сменить ключ данных")
+    rotate.set_defaults(handler=cmd_rotate)
+
+    agent = commands.add_parser("agent", help="агент разблокировки (start, lock, status)")
+    agent.add_argument("action", choices=("start", "lock", "status"))
+    agent.add_argument("--foreground", action="store_true", help="не уходить в фон")
+    agent.add_argument("--timeout", type=float, help="время простоя до блокировки, секунд")
+    agent.set_defaults(handler=cmd_agent)
+
+    serve = commands.add_parser("serve", help="локальный JSON-RPC сервер для других сервисов")
+    serve.add_argument("--socket", help="путь к Unix-сокету (по умолчанию data/rpc.sock)")
+    serve.add_argument("--tcp", metavar="HOST:PORT",
+                       help="слушать TCP на loopback (127.0.0.1, ::1) вместо Unix-сокета")
+    serve.set_defaults(handler=cmd_serve)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Точка входа консольного интерфейса"""
+    args = build_parser().parse_args(argv)
+    try:
+        return args.handler(args)
+    except CliError as e:
+        print(e, file=sys.stderr)
+        return e.code
+    except KeyboardInterrupt:
+        return 130
+    except BrokenPipeError:
+        # Вывод обрезан (например, через head) - это не ошибка
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return EXIT_OK
+    finally:
+        if "core.database" in sys.modules:
+            sys.modules["core.database"].db_manager.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
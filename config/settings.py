@@ -1,5 +1,6 @@
 """Настройки и конфигурация приложения Digital Fortress"""
 
+import os
 from pathlib import Path
 
 # Основные настройки приложения
@@ -11,8 +12,50 @@ APP_CONFIG = {
     "MIN_PASSWORD_LENGTH": 8,
     "MASTER_PASSWORD_LENGTH": 6,
     "PBKDF2_ITERATIONS": 100_000,
+    "KDF_ALGORITHM": "scrypt",
+    "KDF_TARGET_MS": 500,
+    "KDF_MAX_MEMORY_MB": 128,
+    "SCRYPT_MIN_N": 2 ** 14,
     "SALT_SIZE": 16,
     "DATA_KEY_SIZE": 32,
+    "CRYPTO_WORKERS": min(8, os.cpu_count() or 1),
+    "CRYPTO_PARALLEL_THRESHOLD": 256,
+    "DB_STATEMENT_CACHE_SIZE": 128,
+    "DB_BATCH_SIZE": 500,
+    "DB_JOURNAL_MODE": "WAL",
+    "DB_BUSY_TIMEOUT_MS": 5000,
+    "DB_LOCK_RETRIES": 3,
+    "DB_WAL_AUTOCHECKPOINT": 1000,
+    "IMPORT_CHUNK_SIZE": 2000,
+    "EXPORT_PAGE_SIZE": 1000,
+    "ROTATION_CHUNK_SIZE": 5000,
+    "LIST_PAGE_SIZE": 500,
+    "LIST_ROW_HEIGHT": 56,
+    "LIST_OVERSCAN": 2,
+    "SECRET_CACHE_SIZE": 64,
+    "SECRET_CACHE_TTL": 60,
+    "SEARCH_RESULT_LIMIT": 200,
+    "SEARCH_CANDIDATE_LIMIT": 2000,
+    "FUZZY_CANDIDATE_LIMIT": 1000,
+    "SEARCH_DEBOUNCE_MS": 150,
+    "TASK_WORKERS": 2,
+    "TASK_POLL_MS": 15,
+    "AGENT_SOCKET_FILENAME": "agent.sock",
+    "AGENT_IDLE_TIMEOUT": 900,
+    "AGENT_CLIENT_TIMEOUT": 5,
+    "VAULT_READ_WORKERS": min(4, os.cpu_count() or 1),
+    "RPC_SOCKET_FILENAME": "rpc.sock",
+    "RPC_TOKEN_FILENAME": "rpc.token",
+    "RPC_WORKERS": min(4, os.cpu_count() or 1),
+    "RPC_RATE_LIMIT": 500,
+    "RPC_RATE_BURST": 1000,
+    "RPC_AUTH_RATE": 5,
+    "RPC_AUTH_BURST": 10,
+    "RPC_TCP_CONNECT_RATE": 20,
+    "RPC_TCP_CONNECT_BURST": 100,
+    "RPC_MAX_BATCH": 100,
+    "RPC_MAX_MESSAGE_BYTES": 1 << 20,
+    "RPC_IDLE_TIMEOUT": 300,
     "WINDOW_SIZE": {"width": 900, "height": 600},
     "LOGIN_WINDOW_SIZE": {"width": 460, "height": 280},
     "TOAST_DURATION": 1800,
@@ -30,6 +73,9 @@ ROOT_DIR = Path(__file__).parent.parent
 DATA_DIR = ROOT_DIR / "data"
 DB_PATH = DATA_DIR / APP_CONFIG["DB_FILENAME"]
 KDF_PATH = DATA_DIR / APP_CONFIG["KDF_FILENAME"]
+RPC_SOCKET_PATH = DATA_DIR / APP_CONFIG["RPC_SOCKET_FILENAME"]
+RPC_TOKEN_PATH = DATA_DIR / APP_CONFIG["RPC_TOKEN_FILENAME"]
+AGENT_SOCKET_PATH = Path(os.environ.get("FORTRESS_AGENT_SOCK") or DATA_DIR / APP_CONFIG["AGENT_SOCKET_FILENAME"])
 
 # Создаем папку data если её нет
 DATA_DIR.mkdir(exist_ok=True)
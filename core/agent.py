@@ -0,0 +1,297 @@
+"""Агент разблокировки: хранит ключ данных в памяти отдельного процесса
+
+Аналог ssh-agent. Хранилище разблокируется один раз, после чего агент
+обслуживает запросы клиентов через Unix-сокет с правами 0600: чтение,
+поиск и сохранение записей, шифрование и расшифровка. Ключ данных
+клиентам не передается.
+
+Протокол: одна строка JSON на запрос и на ответ.
+    {"op": "get", "service": "github.com"}
+    {"ok": true, "result": [id, login, password, comment]}
+    {"ok": false, "error": "..."}
+
+При простое дольше AGENT_IDLE_TIMEOUT секунд или по команде lock агент
+забывает ключ, удаляет сокет и завершается.
+
+Клиентская часть не импортирует криптографию и базу данных, поэтому
+запрос через агента не платит за их загрузку.
+"""
+
+import base64
+import json
+import os
+import select
+import socket
+import struct
+import threading
+import time
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from config.settings import AGENT_SOCKET_PATH, APP_CONFIG
+
+
+class AgentError(Exception):
+    """Агент недоступен или вернул ошибку"""
+
+
+class AgentClient:
+    """Клиент агента разблокировки"""
+
+    def __init__(self, socket_path: Path = AGENT_SOCKET_PATH, timeout: Optional[float] = None):
+        self._socket_path = Path(socket_path)
+        self._timeout = timeout if timeout is not None else APP_CONFIG["AGENT_CLIENT_TIMEOUT"]
+        self._sock: Optional[socket.socket] = None
+        self._reader = None
+
+    def _connect(self) -> None:
+        """Подключиться к сокету агента"""
+        if not hasattr(socket, "AF_UNIX"):
+            raise AgentError("Unix-сокеты не поддерживаются на этой платформе")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self._timeout)
+        try:
+            sock.connect(str(self._socket_path))
+        except OSError as e:
+            sock.close()
+            raise AgentError(f"Агент недоступен: {e}") from None
+        self._sock = sock
+        self._reader = sock.makefile("rb")
+
+    def request(self, op: str, **params: Any) -> Any:
+        """Выполнить запрос и вернуть результат"""
+        if self._sock is None:
+            self._connect()
+        message = json.dumps(dict(params, op=op), ensure_ascii=False).encode("utf-8") + b"\n"
+        try:
+            self._sock.sendall(message)
+            line = self._reader.readline()
+        except OSError as e:
+            self.close()
+            raise AgentError(f"Ошибка связи с агентом: {e}") from None
+        if not line:
+            self.close()
+            raise AgentError("Агент закрыл соединение")
+
+        response = json.loads(line)
+        if not response.get("ok"):
+            raise AgentError(response.get("error", "Неизвестная ошибка агента"))
+        return response.get("result")
+
+    def ping(self) -> bool:
+        """Проверить, что агент запущен и хранилище разблокировано"""
+        try:
+            return self.request("ping") == "pong"
+        except AgentError:
+            return False
+
+    def close(self) -> None:
+        """Закрыть соединение"""
+        if self._sock is not None:
+            self._reader.close()
+            self._sock.close()
+            self._sock = self._reader = None
+
+    def __enter__(self) -> "AgentClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def connect_agent(socket_path: Path = AGENT_SOCKET_PATH) -> Optional[AgentClient]:
+    """Подключиться к агенту, если он запущен (иначе None)"""
+    if not socket_path.exists():
+        return None
+    client = AgentClient(socket_path)
+    if client.ping():
+        return client
+    client.close()
+    return None
+
+
+class AgentServer:
+    """Сервер агента; каждое соединение обслуживается в своем потоке
+
+    Медленный или молчащий клиент не задерживает остальных. Соединения
+    с базой потоки берут у DatabaseManager (по одному на поток), записи
+    сериализуются его блокировкой.
+    """
+
+    def __init__(self, socket_path: Path = AGENT_SOCKET_PATH, idle_timeout: Optional[float] = None):
+        from core.crypto import crypto_manager
+
+        self._crypto = crypto_manager
+        self._db = None
+        self._socket_path = Path(socket_path)
+        self._idle_timeout = idle_timeout if idle_timeout is not None else APP_CONFIG["AGENT_IDLE_TIMEOUT"]
+        self._sock: Optional[socket.socket] = None
+        self._running = False
+        # Пробуждение цикла приема по команде lock
+        self._wake_reader: Optional[socket.socket] = None
+        self._wake_writer: Optional[socket.socket] = None
+        self._activity_lock = threading.Lock()
+        self._active = 0
+        self._last_activity = time.monotonic()
+        self._handlers: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+            "ping": lambda request: "pong",
+            "get": self._op_get,
+            "put": self._op_put,
+            "list": self._op_list,
+            "search": self._op_search,
+            "encrypt": self._op_encrypt,
+            "decrypt": self._op_decrypt,
+            "lock": self._op_lock,
+        }
+
+    def bind(self) -> None:
+        """Создать сокет, доступный только владельцу"""
+        if connect_agent(self._socket_path) is not None:
+            raise AgentError(f"Агент уже запущен: {self._socket_path}")
+        # Сокет от завершившегося агента
+        self._socket_path.unlink(missing_ok=True)
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)
+        try:
+            sock.bind(str(self._socket_path))
+        finally:
+            os.umask(old_umask)
+        os.chmod(self._socket_path, 0o600)
+        sock.listen(16)
+        self._sock = sock
+
+    def serve_forever(self) -> None:
+        """Обслуживать клиентов до блокировки или истечения времени простоя
+
+        База данных открывается здесь, а не в конструкторе: при запуске
+        в фоне процесс успевает отделиться до создания соединения.
+        """
+        from core.database import db_manager
+
+        self._db = db_manager
+        if self._sock is None:
+            self.bind()
+        self._running = True
+        self._wake_reader, self._wake_writer = socket.socketpair()
+        self._last_activity = time.monotonic()
+        try:
+            while self._running:
+                ready, _, _ = select.select([self._sock, self._wake_reader], [], [], min(self._idle_timeout, 1.0))
+                if self._wake_reader in ready:
+                    break
+                if not ready:
+                    with self._activity_lock:
+                        idle = not self._active and time.monotonic() - self._last_activity > self._idle_timeout
+                    if idle:
+                        break
+                    continue
+                try:
+                    conn, _ = self._sock.accept()
+                except OSError:
+                    continue
+                if not self._peer_allowed(conn):
+                    conn.close()
+                    continue
+                with self._activity_lock:
+                    self._active += 1
+                threading.Thread(target=self._serve_connection, args=(conn,),
+                                 name="agent-client", daemon=True).start()
+        finally:
+            self.shutdown()
+
+    def detach(self) -> None:
+        """Закрыть копию сокета в родительском процессе, не удаляя файл"""
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def shutdown(self) -> None:
+        """Забыть ключ, закрыть базу и удалить сокет"""
+        self._running = False
+        self._crypto.lock()
+        if self._db is not None:
+            self._db.close()
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            self._socket_path.unlink(missing_ok=True)
+        for sock in (self._wake_reader, self._wake_writer):
+            if sock is not None:
+                sock.close()
+        self._wake_reader = self._wake_writer = None
+
+    @staticmethod
+    def _peer_allowed(conn: socket.socket) -> bool:
+        """Принимать только процессы того же пользователя (где ОС это сообщает)"""
+        peercred = getattr(socket, "SO_PEERCRED", None)
+        if peercred is None:
+            return True
+        creds = conn.getsockopt(socket.SOL_SOCKET, peercred, struct.calcsize("3i"))
+        _pid, uid, _gid = struct.unpack("3i", creds)
+        return uid == os.getuid()
+
+    def _serve_connection(self, conn: socket.socket) -> None:
+        """Обработать запросы одного клиента (в отдельном потоке)"""
+        conn.settimeout(APP_CONFIG["AGENT_CLIENT_TIMEOUT"])
+        reader = conn.makefile("rb")
+        try:
+            for line in reader:
+                try:
+                    request = json.loads(line)
+                    result = self._handlers[request["op"]](request)
+                    response = {"ok": True, "result": result}
+                except KeyError as e:
+                    response = {"ok": False, "error": f"Неизвестная операция или параметр: {e}"}
+                except Exception as e:
+                    response = {"ok": False, "error": str(e)}
+                conn.sendall(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+                if not self._running:
+                    break
+        except OSError:
+            # Клиент отключился или молчит дольше таймаута
+            pass
+        finally:
+            reader.close()
+            conn.close()
+            with self._activity_lock:
+                self._active -= 1
+                self._last_activity = time.monotonic()
+
+    def _op_get(self, request: Dict[str, Any]) -> Any:
+        return self._db.get_credential(request["service"])
+
+    def _op_put(self, request: Dict[str, Any]) -> None:
+        self._db.save_credential(request["service"], request.get("login", ""), request["password"],
+                                 request.get("comment", ""), request.get("credential_id"))
+
+    def _op_list(self, request: Dict[str, Any]) -> Any:
+        rows = self._db.iter_credentials(request.get("after"))
+        return list(islice(rows, request["limit"]) if request.get("limit") else rows)
+
+    def _op_search(self, request: Dict[str, Any]) -> Any:
+        return self._db.search_credentials(request["query"], request.get("limit"))
+
+    def _op_encrypt(self, request: Dict[str, Any]) -> str:
+        token = self._crypto.encrypt_password(request["data"])
+        return base64.b64encode(token).decode("ascii")
+
+    def _op_decrypt(self, request: Dict[str, Any]) -> str:
+        return self._crypto.decrypt_password(base64.b64decode(request["token"]))
+
+    def _op_lock(self, request: Dict[str, Any]) -> None:
+        self._running = False
+        try:
+            self._wake_writer.send(b"\0")
+        except (AttributeError, OSError):
+            pass
+
+
+def disable_core_dumps() -> None:
+    """Запретить дампы памяти процесса, хранящего ключ"""
+    try:
+        import resource
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    except (ImportError, ValueError, OSError):
+        pass
@@ -0,0 +1,150 @@
+"""Асинхронный фасад хранилища для встраивания в asyncio-приложения
+
+DatabaseManager и CryptoManager синхронные: каждый запрос к SQLite и
+каждое вычисление ключа блокировали бы цикл событий. AsyncVault выносит
+их из цикла:
+
+- записи выполняются в отдельном потоке с собственным соединением,
+  поэтому они упорядочены и не конкурируют за блокировку базы;
+- чтения идут в пуле потоков (у каждого потока свое соединение) и
+  выполняются параллельно - в режиме WAL они не ждут записи;
+- вычисление ключа при разблокировке и шифрование выполняются в пуле
+  для вычислений.
+
+Пример:
+    async with AsyncVault() as vault:
+        if await vault.unlock(password):
+            async for service, login in vault.iter_credentials():
+                ...
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from config.settings import APP_CONFIG
+
+
+class AsyncVault:
+    """Асинхронный доступ к DatabaseManager и CryptoManager"""
+
+    def __init__(self, db=None, crypto=None, read_workers: Optional[int] = None):
+        if crypto is None:
+            from core.crypto import crypto_manager as crypto
+        if db is None:
+            from core.database import db_manager as db
+        self._db = db
+        self._crypto = crypto
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vault-writer")
+        self._readers = ThreadPoolExecutor(max_workers=read_workers or APP_CONFIG["VAULT_READ_WORKERS"],
+                                           thread_name_prefix="vault-reader")
+        self._compute = ThreadPoolExecutor(max_workers=APP_CONFIG["CRYPTO_WORKERS"],
+                                           thread_name_prefix="vault-crypto")
+
+    async def __aenter__(self) -> "AsyncVault":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    @staticmethod
+    async def _run(executor: ThreadPoolExecutor, func, *args, **kwargs):
+        """Выполнить блокирующую функцию в пуле, не блокируя цикл событий"""
+        return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+    # Сессия
+
+    async def unlock(self, password: str) -> bool:
+        """Проверить мастер-пароль и открыть сессию"""
+        return await self._run(self._compute, self._crypto.verify_password, password)
+
+    async def create(self, password: str) -> None:
+        """Создать новое хранилище и открыть сессию"""
+        await self._run(self._compute, self._crypto.create_vault, password)
+
+    def lock(self) -> None:
+        """Забыть ключ данных и расшифрованные кэши"""
+        self._crypto.lock()
+
+    async def close(self) -> None:
+        """Дождаться текущих операций и остановить пулы потоков
+
+        Менеджер базы принадлежит вызывающему коду (по умолчанию это общий
+        db_manager процесса) и не закрывается: его соединениями и кэшами
+        в это время могут пользоваться другие потоки.
+        """
+        for executor in (self._writer, self._readers, self._compute):
+            await asyncio.get_running_loop().run_in_executor(None, functools.partial(executor.shutdown, wait=True))
+
+    # Чтение
+
+    async def get(self, service: str) -> Optional[Tuple[int, str, str, str]]:
+        """Получить (id, login, password, comment) по имени сервиса"""
+        return await self._run(self._readers, self._db.get_credential, service)
+
+    async def get_many(self, services: Iterable[str]) -> Dict[str, Optional[Tuple[int, str, str, str]]]:
+        """Получить несколько записей одной задачей пула"""
+        services = list(services)
+        return await self._run(self._readers, lambda: {service: self._db.get_credential(service)
+                                                       for service in services})
+
+    async def exists(self, service: str) -> bool:
+        """Проверить существование сервиса"""
+        return await self._run(self._readers, self._db.service_exists, service)
+
+    async def list_page(self, after: Optional[str] = None,
+                        page_size: Optional[int] = None) -> List[Tuple[str, str]]:
+        """Одна страница пар (service, login) после сервиса after"""
+        page_size = page_size or APP_CONFIG["LIST_PAGE_SIZE"]
+        return await self._run(self._readers,
+                               lambda: list(islice(self._db.iter_credentials(after, page_size), page_size)))
+
+    async def iter_credentials(self, after: Optional[str] = None,
+                               page_size: Optional[int] = None) -> AsyncIterator[Tuple[str, str]]:
+        """Перебрать пары (service, login) в алфавитном порядке
+
+        Страницы запрашиваются по мере потребления, так что обход большого
+        хранилища не держит поток пула и не загружает все записи сразу.
+        """
+        page_size = page_size or APP_CONFIG["LIST_PAGE_SIZE"]
+        while True:
+            page = await self.list_page(after, page_size)
+            for row in page:
+                yield row
+            if len(page) < page_size:
+                return
+            after = page[-1][0]
+
+    async def search(self, query: str, limit: Optional[int] = None) -> AsyncIterator[Tuple[str, str]]:
+        """Перебрать результаты поиска по сервису и логину"""
+        rows = await self._run(self._readers, self._db.search_credentials, query, limit)
+        for row in rows:
+            yield row
+
+    # Запись
+
+    async def put(self, service: str, login: str, password: str, comment: str = "",
+                  credential_id: Optional[int] = None) -> None:
+        """Создать или обновить запись"""
+        await self._run(self._writer, self._db.save_credential, service, login, password, comment, credential_id)
+
+    async def put_many(self, credentials: Iterable[Tuple[str, str, str, str]]) -> Tuple[int, List[str]]:
+        """Добавить набор записей одной транзакцией; возвращает (добавлено, конфликты)"""
+        credentials = list(credentials)
+        return await self._run(self._writer, self._db.save_credentials_many, credentials)
+
+    async def delete(self, credential_id: int) -> None:
+        """Удалить запись по ID"""
+        await self._run(self._writer, self._db.delete_credential, credential_id)
+
+    # Шифрование
+
+    async def encrypt(self, value: str) -> bytes:
+        """Зашифровать строку ключом данных сессии"""
+        return await self._run(self._compute, self._crypto.encrypt_password, value)
+
+    async def decrypt(self, token: bytes) -> str:
+        """Расшифровать токен ключом данных сессии"""
+        return await self._run(self._compute, self._crypto.decrypt_password, token)
@@ -0,0 +1,121 @@
+"""Ограниченный кэш расшифрованных записей"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Optional, Tuple
+
+Credential = Tuple[int, str, str, str]
+
+
+class _Entry:
+    """Запись кэша; пароль хранится в изменяемом буфере, чтобы его можно было затереть"""
+
+    __slots__ = ("expires", "credential_id", "login", "password", "comment")
+
+    def __init__(self, expires: float, credential: Credential):
+        self.expires = expires
+        self.credential_id, self.login, password, self.comment = credential
+        self.password = bytearray(password.encode("utf-8"))
+
+    def wipe(self) -> None:
+        """Затереть пароль в памяти"""
+        self.password[:] = bytes(len(self.password))
+
+    def credential(self) -> Credential:
+        """Вернуть запись в формате DatabaseManager.get_credential"""
+        return self.credential_id, self.login, self.password.decode("utf-8"), self.comment
+
+
+class SecretCache:
+    """LRU-кэш расшифрованных учетных данных с временем жизни записей
+
+    Пароли затираются при вытеснении, истечении срока и очистке кэша.
+    Истекшие записи вычищаются при каждом get и put, а не только при
+    повторном обращении к тому же сервису.
+    Строки, уже отданные вызывающему коду, затереть нельзя - кэш лишь
+    ограничивает число и время жизни копий, которые держит сам.
+
+    Каждое удаление увеличивает поколение кэша. Запись, прочитанная из базы
+    до параллельного изменения или блокировки сессии, передается в put
+    с поколением на момент чтения и не попадает в кэш.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        # Записи в порядке добавления: срок жизни общий, поэтому это и порядок
+        # истечения (порядок _entries меняется при каждом обращении)
+        self._expiry: "deque[Tuple[str, _Entry]]" = deque()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        """Номер поколения: меняется при каждой инвалидации и очистке"""
+        return self._generation
+
+    def get(self, service: str) -> Optional[Credential]:
+        """Получить запись по имени сервиса или None"""
+        with self._lock:
+            self._sweep()
+            entry = self._entries.get(service)
+            if entry is None:
+                return None
+            self._entries.move_to_end(service)
+            return entry.credential()
+
+    def put(self, service: str, credential: Credential, generation: Optional[int] = None) -> None:
+        """Сохранить запись, вытеснив самую старую при переполнении
+
+        Если передано поколение и кэш с тех пор инвалидировался, запись
+        считается устаревшей и не сохраняется.
+        """
+        if self._max_size <= 0:
+            return
+        with self._lock:
+            self._sweep()
+            if generation is not None and generation != self._generation:
+                return
+            if service in self._entries:
+                self._drop(service)
+            entry = self._entries[service] = _Entry(time.monotonic() + self._ttl, credential)
+            self._expiry.append((service, entry))
+            while len(self._entries) > self._max_size:
+                self._drop(next(iter(self._entries)))
+            if len(self._expiry) > 2 * self._max_size:
+                # Вытесненные и замененные записи остаются в очереди до истечения
+                self._expiry = deque(sorted(self._entries.items(), key=lambda pair: pair[1].expires))
+
+    def invalidate(self, service: Optional[str] = None, credential_id: Optional[int] = None) -> None:
+        """Удалить запись по имени сервиса и/или по ID"""
+        with self._lock:
+            self._generation += 1
+            if service is not None and service in self._entries:
+                self._drop(service)
+            if credential_id is not None:
+                for key in [k for k, e in self._entries.items() if e.credential_id == credential_id]:
+                    self._drop(key)
+
+    def clear(self) -> None:
+        """Затереть и удалить все записи"""
+        with self._lock:
+            self._generation += 1
+            for entry in self._entries.values():
+                entry.wipe()
+            self._entries.clear()
+            self._expiry.clear()
+
+    def _sweep(self) -> None:
+        """Затереть и удалить истекшие записи (вызывается под блокировкой)"""
+        now = time.monotonic()
+        while self._expiry and self._expiry[0][1].expires < now:
+            service, entry = self._expiry.popleft()
+            # Запись могли уже удалить или заменить новой
+            if self._entries.get(service) is entry:
+                self._drop(service)
+
+    def _drop(self, service: str) -> None:
+        """Удалить запись с затиранием (вызывается под блокировкой)"""
+        self._entries.pop(service).wipe()
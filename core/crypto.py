@@ -2,85 +2,271 @@
 
 import os
 import base64
-from cryptography.hazmat.primitives import hashes
+import hashlib
+import hmac
+import threading
+from typing import TYPE_CHECKING, Callable, Iterable, List, NamedTuple, Optional, Tuple
+from cryptography.exceptions import InvalidTag
 from cryptography.fernet import Fernet, InvalidToken
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 
 from config.settings import APP_CONFIG, KDF_PATH
+from core import kdf
+
+if TYPE_CHECKING:
+    from concurrent.futures import ThreadPoolExecutor
+
+# Байт формата записи; токены Fernet всегда начинаются с "g" (0x67)
+RECORD_AEAD_V1 = b"\x01"
+NONCE_SIZE = 12
+
+
+class RecordCipher:
+    """Шифрование отдельных паролей ключом данных
+
+    Новые записи пишутся в компактном двоичном формате
+    RECORD_AEAD_V1 | nonce (12 байт) | AES-256-GCM шифртекст с тегом.
+    Ключ AES-GCM выводится из ключа данных через HKDF. Записи в старом
+    формате (токены Fernet) по-прежнему расшифровываются.
+    key_id - отпечаток ключа данных, по которому процессы сверяют, что
+    шифруют записи действующим ключом хранилища.
+    """
+
+    def __init__(self, data_key: bytes):
+        self.fernet = Fernet(data_key)
+        record_key = HKDF(
+            algorithm=hashes.SHA256(), length=32, salt=None, info=b"digital-fortress record v1"
+        ).derive(base64.urlsafe_b64decode(data_key))
+        self._aead = AESGCM(record_key)
+        self._blind_key = HKDF(
+            algorithm=hashes.SHA256(), length=32, salt=None, info=b"digital-fortress blind index v1"
+        ).derive(base64.urlsafe_b64decode(data_key))
+        self.key_id = HKDF(
+            algorithm=hashes.SHA256(), length=16, salt=None, info=b"digital-fortress key id v1"
+        ).derive(base64.urlsafe_b64decode(data_key)).hex()
+
+    def encrypt(self, data: bytes) -> bytes:
+        """Зашифровать данные в компактном формате"""
+        nonce = os.urandom(NONCE_SIZE)
+        return RECORD_AEAD_V1 + nonce + self._aead.encrypt(nonce, data, None)
+
+    def decrypt(self, token: bytes) -> bytes:
+        """Расшифровать запись в любом поддерживаемом формате"""
+        token = bytes(token)
+        if token[:1] == RECORD_AEAD_V1:
+            nonce = token[1:1 + NONCE_SIZE]
+            try:
+                return self._aead.decrypt(nonce, token[1 + NONCE_SIZE:], None)
+            except InvalidTag:
+                raise InvalidToken
+        return self.fernet.decrypt(token)
+
+    def blind_index(self, value: str) -> str:
+        """Слепой индекс для точного поиска по зашифрованному значению (HMAC-SHA256)"""
+        return hmac.new(self._blind_key, value.encode("utf-8"), hashlib.sha256).hexdigest()
+
+    @staticmethod
+    def is_legacy(token: bytes) -> bool:
+        """Записана ли запись в старом формате Fernet"""
+        return bytes(token[:1]) != RECORD_AEAD_V1
+
+
+class Session(NamedTuple):
+    """Неизменяемое состояние разблокированной сессии"""
+    data_key: bytes
+    records: RecordCipher
 
 
 class CryptoManager:
-    """Класс для управления криптографическими операциями"""
+    """Класс для управления криптографическими операциями
+
+    Безопасен для использования из нескольких потоков. Состояние сессии -
+    один неизменяемый объект Session, который заменяется целиком, поэтому
+    операция, получившая сессию, работает с согласованными ключом и шифром
+    даже при параллельной блокировке. Смена состояния и запись файла ключа
+    сериализуются блокировкой.
+    """
 
     def __init__(self):
-        self.decrypted_key = None
-
-    def get_derived_key(self, password: str, salt: bytes) -> bytes:
-        """Получить производный ключ из пароля и соли"""
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=APP_CONFIG["PBKDF2_ITERATIONS"],
-            backend=default_backend()
-        )
-        return kdf.derive(password.encode())
+        self._session: Optional[Session] = None
+        self._state_lock = threading.RLock()
+        self._executor: Optional["ThreadPoolExecutor"] = None
+        self._lock_listeners: List[Callable[[], None]] = []
 
-    def create_vault(self, password: str) -> None:
-        """Создать новое хранилище с мастер-паролем"""
-        # Генерируем соль и создаем мастер-ключ
-        salt = os.urandom(APP_CONFIG["SALT_SIZE"])
-        master_key = self.get_derived_key(password, salt)
+    @property
+    def session(self) -> Optional[Session]:
+        """Текущая сессия или None, если хранилище заблокировано"""
+        return self._session
+
+    @property
+    def decrypted_key(self) -> Optional[bytes]:
+        """Ключ данных текущей сессии"""
+        session = self._session
+        return session.data_key if session is not None else None
+
+    @decrypted_key.setter
+    def decrypted_key(self, key: Optional[bytes]) -> None:
+        # Шифры создаются один раз на сессию, а не на каждую операцию
+        session = Session(key, RecordCipher(key)) if key is not None else None
+        with self._state_lock:
+            self._session = session
+
+    def add_lock_listener(self, callback: Callable[[], None]) -> None:
+        """Подписаться на блокировку сессии (например, для очистки кэшей)"""
+        with self._state_lock:
+            self._lock_listeners.append(callback)
+
+    def lock(self) -> None:
+        """Заблокировать сессию: забыть ключ данных и уведомить подписчиков"""
+        with self._state_lock:
+            self._session = None
+            listeners = list(self._lock_listeners)
+        for callback in listeners:
+            callback()
+
+    def get_derived_key(self, password: str, params: kdf.KdfParams) -> bytes:
+        """Получить производный ключ из пароля по параметрам KDF"""
+        return kdf.derive_key(password, params)
+
+    def wrap_data_key(self, password: str, data_key: bytes) -> bytes:
+        """Зашифровать ключ данных мастер-ключом с откалиброванными параметрами KDF
 
-        # Генерируем ключ для данных
+        Возвращает содержимое файла fortress.kdf.
+        """
+        params = kdf.calibrate(APP_CONFIG["KDF_ALGORITHM"], APP_CONFIG["KDF_TARGET_MS"])
+        master_key = self.get_derived_key(password, params)
+        f = Fernet(base64.urlsafe_b64encode(master_key))
+        return kdf.pack(params, f.encrypt(data_key))
+
+    @staticmethod
+    def write_kdf_file(content: bytes) -> None:
+        """Атомарно записать файл ключа (через временный файл)"""
+        tmp_path = KDF_PATH.with_name(KDF_PATH.name + ".tmp")
+        with open(tmp_path, "wb") as f_out:
+            f_out.write(content)
+            f_out.flush()
+            os.fsync(f_out.fileno())
+        os.replace(tmp_path, KDF_PATH)
+
+    def create_vault(self, password: str) -> None:
+        """Создать новое хранилище с мастер-паролем и открыть его"""
+        # Генерируем ключ для данных и шифруем его мастер-ключом
         data_key = Fernet.generate_key()
+        content = self.wrap_data_key(password, data_key)
+        with self._state_lock:
+            self.write_kdf_file(content)
+            # Сессия сразу разблокирована - повторная деривация ключа не нужна
+            self.decrypted_key = data_key
+
+    def unwrap_data_key(self, password: str, content: bytes) -> Tuple[bytes, bool]:
+        """Расшифровать ключ данных из содержимого файла ключа
+
+        Возвращает (ключ данных, нужно ли перевыпустить файл).
+        При неверном пароле выбрасывает InvalidToken.
+        """
+        version, params, encrypted_data_key = kdf.unpack(content)
 
-        # Шифруем ключ данных мастер-ключом
+        # Получаем мастер-ключ
+        master_key = self.get_derived_key(password, params)
         f = Fernet(base64.urlsafe_b64encode(master_key))
-        encrypted_data_key = f.encrypt(data_key)
 
-        # Сохраняем в файл
-        with open(KDF_PATH, "wb") as f_out:
-            f_out.write(salt)
-            f_out.write(encrypted_data_key)
+        # Расшифровываем ключ данных
+        return f.decrypt(encrypted_data_key), kdf.needs_upgrade(version, params)
 
     def verify_password(self, password: str) -> bool:
-        """Проверить мастер-пароль и получить ключ данных"""
-        try:
-            with open(KDF_PATH, "rb") as f:
-                salt = f.read(APP_CONFIG["SALT_SIZE"])
-                encrypted_data_key = f.read()
+        """Проверить мастер-пароль и получить ключ данных
 
-            # Получаем мастер-ключ
-            master_key = self.get_derived_key(password, salt)
-            f = Fernet(base64.urlsafe_b64encode(master_key))
+        Файлы ключа старого формата или с устаревшим алгоритмом после
+        успешной проверки перевыпускаются с текущими параметрами KDF.
+        """
+        try:
+            data_key, needs_upgrade = self.unwrap_data_key(password, KDF_PATH.read_bytes())
+        except (InvalidToken, FileNotFoundError, ValueError, KeyError):
+            return False
 
-            # Расшифровываем ключ данных
-            self.decrypted_key = f.decrypt(encrypted_data_key)
-            return True
+        # Деривация ключа - самая долгая часть - выполняется без блокировки
+        content = self.wrap_data_key(password, data_key) if needs_upgrade else None
+        with self._state_lock:
+            if content is not None:
+                self.write_kdf_file(content)
+            self.decrypted_key = data_key
+        return True
 
-        except (InvalidToken, FileNotFoundError, IndexError):
-            return False
+    def get_session(self) -> Session:
+        """Получить текущую сессию или выбросить ошибку, если хранилище заблокировано"""
+        session = self._session
+        if session is None:
+            raise RuntimeError("Ключ шифрования не загружен. Войдите в систему.")
+        return session
 
     def get_data_key(self) -> bytes:
         """Получить ключ для шифрования данных"""
-        if self.decrypted_key is None:
-            raise RuntimeError("Ключ шифрования не загружен. Войдите в систему.")
-        return self.decrypted_key
+        return self.get_session().data_key
+
+    def get_record_cipher(self) -> RecordCipher:
+        """Получить шифр записей для ключа данных текущей сессии"""
+        return self.get_session().records
+
+    def get_cipher(self) -> Fernet:
+        """Получить экземпляр Fernet для ключа данных текущей сессии"""
+        return self.get_record_cipher().fernet
 
     def encrypt_password(self, password: str) -> bytes:
         """Зашифровать пароль"""
-        key = self.get_data_key()
-        fernet = Fernet(key)
-        return fernet.encrypt(password.encode())
+        return self.get_record_cipher().encrypt(password.encode())
 
     def decrypt_password(self, encrypted_password: bytes) -> str:
         """Расшифровать пароль"""
-        key = self.get_data_key()
-        fernet = Fernet(key)
-        return fernet.decrypt(encrypted_password).decode('utf-8')
+        return self.get_record_cipher().decrypt(encrypted_password).decode('utf-8')
+
+    def encrypt_many(self, passwords: Iterable[str], parallel: bool = False) -> List[bytes]:
+        """Зашифровать набор паролей
+
+        При parallel=True большие наборы делятся на части и обрабатываются
+        пулом потоков: OpenSSL освобождает GIL на время шифрования.
+        """
+        records = self.get_record_cipher()
+        return self._map(lambda password: records.encrypt(password.encode()), list(passwords), parallel)
+
+    def decrypt_many(self, encrypted_passwords: Iterable[bytes], parallel: bool = False) -> List[str]:
+        """Расшифровать набор паролей (см. encrypt_many)"""
+        records = self.get_record_cipher()
+        return self._map(lambda token: records.decrypt(token).decode('utf-8'), list(encrypted_passwords), parallel)
+
+    def reencrypt_many(self, encrypted_passwords: Iterable[bytes], new_key: Optional[bytes] = None,
+                       parallel: bool = False) -> List[bytes]:
+        """Перешифровать набор паролей в текущий формат
+
+        Без new_key записи остаются на ключе текущей сессии (обновление
+        формата), иначе переводятся на новый ключ данных.
+        """
+        old_records = self.get_record_cipher()
+        new_records = RecordCipher(new_key) if new_key is not None else old_records
+        return self._map(
+            lambda token: new_records.encrypt(old_records.decrypt(token)), list(encrypted_passwords), parallel
+        )
+
+    def _map(self, func: Callable, items: list, parallel: bool) -> list:
+        """Применить функцию к элементам, при необходимости в пуле потоков"""
+        workers = APP_CONFIG["CRYPTO_WORKERS"]
+        if not parallel or workers <= 1 or len(items) < APP_CONFIG["CRYPTO_PARALLEL_THRESHOLD"]:
+            return [func(item) for item in items]
+
+        if self._executor is None:
+            # Пул нужен только для больших наборов - не замедляем запуск импортом
+            from concurrent.futures import ThreadPoolExecutor
+            with self._state_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="crypto")
 
+        size = -(-len(items) // workers)
+        chunks = [items[i:i + size] for i in range(0, len(items), size)]
+        results = []
+        for chunk_result in self._executor.map(lambda chunk: [func(item) for item in chunk], chunks):
+            results.extend(chunk_result)
+        return results
 
 # Глобальный экземпляр менеджера криптографии
 crypto_manager = CryptoManager()
@@ -1,113 +1,842 @@
 """Модуль для работы с базой данных паролей"""
 
+import contextlib
+import functools
+import json
 import sqlite3
-from typing import List, Tuple, Optional
+import threading
+import time
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Set, Tuple, Optional
 
-from config.settings import DB_PATH
-from core.crypto import crypto_manager
+from config.settings import APP_CONFIG, DB_PATH
+from core.cache import SecretCache
+from core.crypto import RecordCipher, crypto_manager
+from core.fuzzy_index import FuzzyIndex
+from core.metadata_index import MetadataIndex, sort_key
+from core.migrations import migrate
+
+# Подстрока в свернутом сервисе или логине; образец - из _like_pattern
+_LIKE_CONDITION = "(c.service_fold LIKE ? ESCAPE '\\' OR c.login_fold LIKE ? ESCAPE '\\')"
+
+
+def _like_pattern(term: str) -> str:
+    """Образец LIKE для поиска подстроки с экранированием спецсимволов"""
+    return "%" + term.casefold().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+class StaleKeyError(RuntimeError):
+    """Ключ данных сессии больше не действует: другой процесс сменил ключ хранилища"""
+
+
+class Change(NamedTuple):
+    """Изменение одной записи для подписчиков add_change_listener
+
+    kind - "inserted", "updated" или "deleted"; item - (service, login) после
+    изменения (None при удалении), previous - до изменения (None при вставке).
+    """
+    kind: str
+    credential_id: int
+    item: Optional[Tuple[str, str]]
+    previous: Optional[Tuple[str, str]]
+
+    @property
+    def sort_key(self) -> Optional[Tuple[str, str]]:
+        """Ключ сортировки записи после изменения (как в get_all_credentials)"""
+        return sort_key(self.item[0]) if self.item else None
+
+
+def _retry_locked(func):
+    """Повторить операцию записи, если база занята другим процессом
+
+    busy_timeout покрывает большинство ожиданий внутри SQLite, но при
+    конфликте снимков в режиме WAL ошибка возвращается сразу.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        retries = APP_CONFIG["DB_LOCK_RETRIES"]
+        for attempt in range(retries + 1):
+            try:
+                return func(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                message = str(e).lower()
+                if attempt == retries or ("locked" not in message and "busy" not in message):
+                    raise
+                time.sleep(0.05 * 2 ** attempt)
+    return wrapper
+
+
+def _serialised(func):
+    """Выполнить метод записи под блокировкой записи менеджера
+
+    Потоки одного процесса пишут по очереди и не тратят время на ожидание
+    блокировки SQLite (busy_timeout), а изменения кэша и индекса метаданных
+    применяются в том же порядке, что и транзакции.
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self._write_lock:
+            return func(self, *args, **kwargs)
+    return wrapper
 
 
 class DatabaseManager:
-    """Класс для управления базой данных паролей"""
+    """Класс для управления базой данных паролей
+
+    Экземпляр можно разделять между потоками: у каждого потока свое
+    соединение, чтения идут параллельно (WAL), записи сериализуются
+    блокировкой _write_lock.
+    """
 
-    def __init__(self):
+    def __init__(self, db_path: Path = DB_PATH):
+        self._db_path = db_path
+        # Каждый поток держит одно долгоживущее соединение
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._fts_enabled: Optional[bool] = None
+        self._secret_cache = SecretCache(APP_CONFIG["SECRET_CACHE_SIZE"], APP_CONFIG["SECRET_CACHE_TTL"])
+        self._encrypted_metadata: Optional[bool] = None
+        self._index: Optional[MetadataIndex] = None
+        self._fuzzy: Optional[FuzzyIndex] = None
+        # Реентерабельная: нечеткий индекс строится из индекса метаданных
+        self._index_lock = threading.RLock()
+        self._change_listeners: List[Callable[[Change], None]] = []
+        # Значение счетчика vault_changes, которому соответствуют кэши в памяти
+        self._changes_seen: Optional[int] = None
+        crypto_manager.add_lock_listener(self._on_lock)
         self.setup_database()
 
+    def _on_lock(self) -> None:
+        """Забыть расшифрованные данные при блокировке сессии"""
+        self._secret_cache.clear()
+        with self._index_lock:
+            self._index = None
+            self._fuzzy = None
+
+    @staticmethod
+    def _read_changes(conn: sqlite3.Connection) -> int:
+        """Прочитать счетчик изменений записей"""
+        return conn.execute("SELECT counter FROM vault_changes WHERE id = 1").fetchone()[0]
+
+    def _sync_changes(self) -> None:
+        """Сбросить кэши, если записи изменил другой процесс
+
+        Собственные записи учитываются в _write_transaction под _write_lock,
+        поэтому расхождение перепроверяется под этой блокировкой: запись
+        из соседнего потока не считается чужой.
+        """
+        if self._read_changes(self.connection) == self._changes_seen:
+            return
+        with self._write_lock:
+            counter = self._read_changes(self.connection)
+            if self._changes_seen is not None and counter != self._changes_seen:
+                self._encrypted_metadata = None
+                self._on_lock()
+            self._changes_seen = counter
+
+    @staticmethod
+    def _check_data_key(conn: sqlite3.Connection, key_id: str) -> None:
+        """Убедиться в транзакции записи, что данные зашифрованы ключом хранилища
+
+        key_id - отпечаток ключа, которым шифровались записываемые значения.
+        Ротация ключа в другом процессе меняет отпечаток в vault_settings,
+        и запись старым ключом отклоняется. Хранилище без отпечатка получает
+        его при первой записи.
+        """
+        row = conn.execute("SELECT value FROM vault_settings WHERE key = 'data_key_id'").fetchone()
+        if row is None:
+            conn.execute("INSERT INTO vault_settings (key, value) VALUES ('data_key_id', ?)", (key_id,))
+            return
+        session = crypto_manager.session
+        # Сессия тоже сверяется: ключ мог смениться, пока значения шифровались
+        if row[0] != key_id or session is None or session.records.key_id != key_id:
+            raise StaleKeyError("Ключ шифрования сменился в другом процессе. Войдите в систему заново.")
+
+    @contextlib.contextmanager
+    def _write_transaction(self, conn: sqlite3.Connection, immediate: bool = False,
+                           key_id: Optional[str] = None) -> Iterator[None]:
+        """Транзакция записи, изменения которой не сбрасывают кэши этого процесса
+
+        Если до транзакции записи менял другой процесс, кэши сбрасываются.
+        При переданном key_id запись зашифрованных значений отклоняется
+        с StaleKeyError, если ключ хранилища сменился (см. _check_data_key);
+        сессия при этом блокируется.
+        """
+        try:
+            with self._write_lock:
+                with conn:
+                    if immediate:
+                        conn.execute("BEGIN IMMEDIATE")
+                    before = self._read_changes(conn)
+                    if key_id is not None:
+                        self._check_data_key(conn, key_id)
+                    yield
+                    after = self._read_changes(conn)
+                if self._changes_seen is not None and before != self._changes_seen:
+                    self._encrypted_metadata = None
+                    self._on_lock()
+                self._changes_seen = after
+        except StaleKeyError:
+            crypto_manager.lock()
+            raise
+
+    def add_change_listener(self, callback: Callable[[Change], None]) -> None:
+        """Подписаться на изменения записей (сохранение, массовое добавление, удаление)
+
+        Вызывается после фиксации транзакции в потоке, выполнившем запись,
+        поэтому подписчик должен только передать изменение дальше.
+        """
+        with self._write_lock:
+            self._change_listeners.append(callback)
+
+    def remove_change_listener(self, callback: Callable[[Change], None]) -> None:
+        """Отписаться от изменений записей"""
+        with self._write_lock:
+            if callback in self._change_listeners:
+                self._change_listeners.remove(callback)
+
+    def _notify(self, change: Change) -> None:
+        """Уведомить подписчиков об изменении записи"""
+        for callback in list(self._change_listeners):
+            callback(change)
+
+    def _read_item(self, conn: sqlite3.Connection, credential_id: int) -> Optional[Tuple[str, str]]:
+        """Прочитать (service, login) записи по ID"""
+        row = conn.execute(
+            "SELECT service, login, encrypted_metadata FROM credentials WHERE id = ?", (credential_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        service, login, metadata = row
+        if metadata is not None:
+            metadata = json.loads(crypto_manager.decrypt_password(metadata))
+            service, login = metadata["service"], metadata["login"]
+        return service, login
+
+    def _connect(self) -> sqlite3.Connection:
+        """Открыть новое соединение с базой данных"""
+        conn = sqlite3.connect(
+            self._db_path,
+            timeout=APP_CONFIG["DB_BUSY_TIMEOUT_MS"] / 1000,
+            check_same_thread=False,
+            cached_statements=APP_CONFIG["DB_STATEMENT_CACHE_SIZE"]
+        )
+        conn.execute(f"PRAGMA wal_autocheckpoint = {int(APP_CONFIG['DB_WAL_AUTOCHECKPOINT'])}")
+        return conn
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Получить соединение текущего потока (создается при первом обращении)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self) -> None:
+        """Закрыть все открытые соединения (вызывать при завершении работы)"""
+        self._on_lock()
+        with self._connections_lock:
+            if self._connections:
+                # Переносим журнал в основной файл, чтобы не оставлять большой -wal
+                try:
+                    self._connections[0].execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                except sqlite3.Error:
+                    pass
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._connections.clear()
+            self._local = threading.local()
+
     def setup_database(self, clear: bool = False) -> None:
-        """Настроить базу данных и создать таблицы"""
+        """Настроить базу данных и применить недостающие миграции схемы"""
         try:
-            with sqlite3.connect(DB_PATH) as conn:
-                cursor = conn.cursor()
-
-                # Создаем таблицу если её нет
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS credentials (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        service TEXT NOT NULL UNIQUE,
-                        login TEXT NOT NULL,
-                        encrypted_password BLOB NOT NULL,
-                        comment TEXT
-                    )
-                """)
-
-                # Проверяем наличие колонки comment
-                cursor.execute("PRAGMA table_info(credentials)")
-                columns = [row[1] for row in cursor.fetchall()]
-                if "comment" not in columns:
-                    cursor.execute("ALTER TABLE credentials ADD COLUMN comment TEXT")
-
-                # Очищаем если нужно
-                if clear:
-                    cursor.execute("DELETE FROM credentials")
-
-                conn.commit()
+            conn = self.connection
+
+            # Режим журнала хранится в файле базы, WAL позволяет читать во время записи
+            conn.execute(f"PRAGMA journal_mode = {APP_CONFIG['DB_JOURNAL_MODE']}")
+
+            migrate(conn)
+            self._finish_key_rotation(conn)
+
+            # Очищаем если нужно
+            if clear:
+                with conn:
+                    conn.execute("DELETE FROM credentials")
+                    conn.execute("DELETE FROM vault_settings")
+                self._encrypted_metadata = None
+                self._on_lock()
 
         except Exception as e:
             raise RuntimeError(f"Ошибка настройки базы данных: {e}")
 
+    @staticmethod
+    def _finish_key_rotation(conn: sqlite3.Connection) -> None:
+        """Завершить ротацию ключа, прерванную после фиксации в базе
+
+        Если записи уже перешифрованы, а новый файл ключа не успел записаться,
+        он восстанавливается из таблицы key_rotation.
+        """
+        row = conn.execute("SELECT kdf_file FROM key_rotation WHERE state = 'committed'").fetchone()
+        if row is None:
+            return
+        crypto_manager.write_kdf_file(row[0])
+        with conn:
+            conn.execute("DELETE FROM credentials_rotated")
+            conn.execute("DELETE FROM key_rotation")
+
+    @property
+    def fts_enabled(self) -> bool:
+        """Доступен ли FTS5-индекс (проверяется один раз при первом поиске)"""
+        if self._fts_enabled is None:
+            self._fts_enabled = self.connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'credentials_fts'"
+            ).fetchone() is not None
+        return self._fts_enabled
+
+    @property
+    def encrypted_metadata(self) -> bool:
+        """Включен ли режим шифрования сервиса, логина и комментария"""
+        if self._encrypted_metadata is None:
+            row = self.connection.execute(
+                "SELECT value FROM vault_settings WHERE key = 'encrypted_metadata'"
+            ).fetchone()
+            self._encrypted_metadata = row is not None and row[0] == "1"
+        return self._encrypted_metadata
+
+    @_serialised
+    def enable_encrypted_metadata(self) -> None:
+        """Включить режим шифрования метаданных для всего хранилища
+
+        Сервис, логин и комментарий переносятся в зашифрованную колонку
+        encrypted_metadata, в колонке service остается HMAC-индекс для точного
+        поиска и ограничения UNIQUE. После преобразования файл базы
+        перестраивается (VACUUM), чтобы в нем не осталось открытых значений.
+        """
+        if self.encrypted_metadata:
+            return
+
+        records = crypto_manager.get_record_cipher()
+        conn = self.connection
+        with self._write_transaction(conn, immediate=True, key_id=records.key_id):
+            last_id = 0
+            while True:
+                page = conn.execute("""
+                    SELECT id, service, login, comment FROM credentials
+                    WHERE id > ? ORDER BY id LIMIT ?
+                """, (last_id, APP_CONFIG["DB_BATCH_SIZE"])).fetchall()
+                if not page:
+                    break
+                metadata = crypto_manager.encrypt_many(
+                    (self._metadata_json(service, login, comment) for _, service, login, comment in page),
+                    parallel=True
+                )
+                conn.executemany("""
+                    UPDATE credentials SET service = ?, login = '', comment = NULL, encrypted_metadata = ?,
+                        service_fold = NULL, login_fold = NULL
+                    WHERE id = ?
+                """, (
+                    (records.blind_index(service), encrypted, credential_id)
+                    for (credential_id, service, _, _), encrypted in zip(page, metadata)
+                ))
+                last_id = page[-1][0]
+            if self.fts_enabled:
+                # Перестройка убирает открытые значения из сегментов полнотекстового индекса
+                conn.execute("INSERT INTO credentials_fts(credentials_fts) VALUES ('rebuild')")
+            conn.execute("INSERT OR REPLACE INTO vault_settings (key, value) VALUES ('encrypted_metadata', '1')")
+
+        self._encrypted_metadata = True
+        self._on_lock()
+        self.checkpoint("TRUNCATE")
+        conn.execute("VACUUM")
+
+    @staticmethod
+    def _metadata_json(service: str, login: str, comment: Optional[str]) -> str:
+        """Сериализовать метаданные записи для шифрования"""
+        return json.dumps({"service": service, "login": login, "comment": comment or ""}, ensure_ascii=False)
+
+    def _service_key(self, service: str) -> str:
+        """Значение колонки service: имя сервиса или его HMAC-индекс"""
+        if self.encrypted_metadata:
+            return crypto_manager.get_record_cipher().blind_index(service)
+        return service
+
+    def _row_values(self, service: str, login: str, encrypted_password: bytes,
+                    comment: str) -> Tuple[str, str, bytes, Optional[str], Optional[bytes], Optional[str], Optional[str]]:
+        """Значения колонок (service, login, encrypted_password, comment, encrypted_metadata,
+        service_fold, login_fold)"""
+        if self.encrypted_metadata:
+            records = crypto_manager.get_record_cipher()
+            metadata = records.encrypt(self._metadata_json(service, login, comment).encode("utf-8"))
+            return records.blind_index(service), "", encrypted_password, None, metadata, None, None
+        return service, login, encrypted_password, comment, None, service.casefold(), login.casefold()
+
+    def _metadata_index(self) -> MetadataIndex:
+        """Получить индекс метаданных, построив его при первом обращении
+
+        Если записи изменил другой процесс, индекс строится заново.
+        """
+        self._sync_changes()
+        with self._index_lock:
+            if self._index is None:
+                conn = self.connection
+                records = []
+                last_id = 0
+                while True:
+                    page = conn.execute("""
+                        SELECT id, encrypted_metadata FROM credentials
+                        WHERE id > ? ORDER BY id LIMIT ?
+                    """, (last_id, APP_CONFIG["LIST_PAGE_SIZE"])).fetchall()
+                    if not page:
+                        break
+                    texts = crypto_manager.decrypt_many((metadata for _, metadata in page), parallel=True)
+                    for (credential_id, _), text in zip(page, texts):
+                        metadata = json.loads(text)
+                        records.append((credential_id, metadata["service"], metadata["login"]))
+                    last_id = page[-1][0]
+                self._index = MetadataIndex(records)
+            return self._index
+
+    def _fuzzy_index(self) -> FuzzyIndex:
+        """Получить индекс нечеткого поиска, построив его при первом обращении
+
+        Если записи изменил другой процесс, индекс строится заново.
+        """
+        self._sync_changes()
+        with self._index_lock:
+            if self._fuzzy is None:
+                if self.encrypted_metadata:
+                    records = self._metadata_index().records()
+                else:
+                    records = self.connection.execute("SELECT id, service, login FROM credentials").fetchall()
+                self._fuzzy = FuzzyIndex(records, APP_CONFIG["FUZZY_CANDIDATE_LIMIT"])
+            return self._fuzzy
+
+    @property
+    def _indexes_built(self) -> bool:
+        """Построен ли хотя бы один индекс в памяти"""
+        return self._index is not None or self._fuzzy is not None
+
+    def _update_index(self, credential_id: int, service: Optional[str] = None, login: str = "") -> None:
+        """Точечно обновить индексы в памяти, которые уже построены"""
+        with self._index_lock:
+            for index in (self._index, self._fuzzy):
+                if index is None:
+                    continue
+                if service is None:
+                    index.remove(credential_id)
+                else:
+                    index.upsert(credential_id, service, login)
+
+    def warm_up(self) -> None:
+        """Фоновая подготовка после разблокировки
+
+        Строит индексы в памяти (метаданных - в режиме шифрования метаданных,
+        нечеткого поиска - всегда) и переводит записи старого формата в
+        компактный.
+        """
+        self._fuzzy_index()
+        self.upgrade_records()
+
+    def checkpoint(self, mode: str = "PASSIVE") -> Tuple[int, int, int]:
+        """Выполнить контрольную точку WAL
+
+        Вызывается после массовых изменений (импорт, ротация ключа), чтобы
+        перенести журнал в основной файл сразу, а не ждать автоматической
+        контрольной точки. Возвращает (busy, страниц в журнале, перенесено страниц).
+        """
+        if mode.upper() not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+            raise ValueError(f"Неизвестный режим контрольной точки: {mode}")
+        return self.connection.execute(f"PRAGMA wal_checkpoint({mode.upper()})").fetchone()
+
+    @_retry_locked
+    @_serialised
     def save_credential(self, service: str, login: str, password: str, comment: str = "", credential_id: Optional[int] = None) -> None:
         """Сохранить или обновить учетные данные"""
+        key_id = crypto_manager.get_record_cipher().key_id
         encrypted_password = crypto_manager.encrypt_password(password)
+        values = self._row_values(service, login, encrypted_password, comment)
 
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-
-            if credential_id:
+        conn = self.connection
+        updating = bool(credential_id)
+        previous = None
+        with self._write_transaction(conn, key_id=key_id):
+            if updating:
+                if self._change_listeners:
+                    previous = self._read_item(conn, credential_id)
                 # Обновляем существующую запись
-                cursor.execute("""
-                    UPDATE credentials SET service = ?, login = ?, encrypted_password = ?, comment = ?
+                cursor = conn.execute("""
+                    UPDATE credentials SET service = ?, login = ?, encrypted_password = ?, comment = ?,
+                        encrypted_metadata = ?, service_fold = ?, login_fold = ?
                     WHERE id = ?
-                """, (service, login, encrypted_password, comment, credential_id))
+                """, (*values, credential_id))
             else:
                 # Создаем новую запись
-                cursor.execute("""
-                    INSERT INTO credentials (service, login, encrypted_password, comment)
-                    VALUES (?, ?, ?, ?)
-                """, (service, login, encrypted_password, comment))
+                cursor = conn.execute("""
+                    INSERT INTO credentials (service, login, encrypted_password, comment, encrypted_metadata,
+                                             service_fold, login_fold)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, values)
+                credential_id = cursor.lastrowid
+
+        if not cursor.rowcount:
+            # Запись удалена раньше (например, другим процессом): индексы не трогаем
+            return
+        self._secret_cache.invalidate(service, credential_id)
+        self._update_index(credential_id, service, login)
+        self._notify(Change("updated" if updating else "inserted", credential_id, (service, login), previous))
+
+    @_serialised
+    def save_credentials_many(self, credentials: Iterable[Tuple[str, str, str, str]],
+                              batch_size: Optional[int] = None) -> Tuple[int, List[str]]:
+        """Массово добавить учетные данные в одной транзакции
+
+        Принимает итерируемый набор кортежей (service, login, password, comment).
+        Записи с уже существующим сервисом не прерывают загрузку, а попадают
+        в список конфликтов. Возвращает (количество добавленных, конфликты).
+        """
+        batch_size = batch_size or APP_CONFIG["DB_BATCH_SIZE"]
+        rows = iter(credentials)
+        inserted = 0
+        conflicts: List[str] = []
+        # Индексам в памяти и подписчикам нужны только сервис и логин, без паролей
+        track = self._indexes_built or bool(self._change_listeners)
+        added: Dict[str, Tuple[str, str]] = {}
 
-            conn.commit()
+        conn = self.connection
+        key_id = crypto_manager.get_record_cipher().key_id
+        with self._write_transaction(conn, immediate=True, key_id=key_id):
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+
+                # Строки предыдущих пакетов уже видны внутри этой транзакции,
+                # поэтому достаточно проверить базу и дубликаты внутри пакета
+                keys = [self._service_key(row[0]) for row in batch]
+                taken = self._existing_services(conn, keys)
+                fresh = []
+                for row, key in zip(batch, keys):
+                    if key in taken:
+                        conflicts.append(row[0])
+                    else:
+                        taken.add(key)
+                        fresh.append(row)
+                        if track:
+                            added[key] = row[0], row[1]
+
+                if not fresh:
+                    continue
+
+                encrypted = crypto_manager.encrypt_many((row[2] for row in fresh), parallel=True)
+                conn.executemany("""
+                    INSERT INTO credentials (service, login, encrypted_password, comment, encrypted_metadata,
+                                             service_fold, login_fold)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, (
+                    self._row_values(service, login, encrypted_password, comment)
+                    for (service, login, _, comment), encrypted_password in zip(fresh, encrypted)
+                ))
+                inserted += len(fresh)
+
+        if added:
+            # Индексы в памяти и подписчики получают записи после фиксации транзакции
+            key_list = list(added)
+            for start in range(0, len(key_list), batch_size):
+                chunk = key_list[start:start + batch_size]
+                placeholders = ", ".join("?" * len(chunk))
+                for credential_id, key in conn.execute(
+                    f"SELECT id, service FROM credentials WHERE service IN ({placeholders})", chunk
+                ):
+                    self._update_index(credential_id, *added[key])
+                    self._notify(Change("inserted", credential_id, added[key], None))
+
+        return inserted, conflicts
+
+    @staticmethod
+    def _existing_services(conn: sqlite3.Connection, services: List[str]) -> Set[str]:
+        """Найти сервисы из списка, которые уже есть в базе"""
+        placeholders = ", ".join("?" * len(services))
+        cursor = conn.execute(
+            f"SELECT service FROM credentials WHERE service IN ({placeholders})", services
+        )
+        return {row[0] for row in cursor}
 
     def get_credential(self, service: str) -> Optional[Tuple[int, str, str, str]]:
         """Получить учетные данные по имени сервиса"""
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT id, login, encrypted_password, comment
-                FROM credentials WHERE service = ?
-            """, (service,))
-            result = cursor.fetchone()
-
-            if result:
-                credential_id, login, encrypted_password, comment = result
-                decrypted_password = crypto_manager.decrypt_password(encrypted_password)
-                return credential_id, login, decrypted_password, comment or ""
+        self._sync_changes()
+        cached = self._secret_cache.get(service)
+        if cached:
+            return cached
+        generation = self._secret_cache.generation
 
-            return None
+        result = self.connection.execute("""
+            SELECT id, login, encrypted_password, comment, encrypted_metadata
+            FROM credentials WHERE service = ?
+        """, (self._service_key(service),)).fetchone()
+
+        if result:
+            credential_id, login, encrypted_password, comment, metadata = result
+            if metadata is not None:
+                metadata = json.loads(crypto_manager.decrypt_password(metadata))
+                login, comment = metadata["login"], metadata["comment"]
+            decrypted_password = crypto_manager.decrypt_password(encrypted_password)
+            if RecordCipher.is_legacy(encrypted_password):
+                self._upgrade_record(credential_id, encrypted_password, decrypted_password)
+            credential = credential_id, login, decrypted_password, comment or ""
+            self._secret_cache.put(service, credential, generation)
+            return credential
+
+        return None
+
+    def _upgrade_record(self, credential_id: int, encrypted_password: bytes, password: str) -> None:
+        """Переписать запись старого формата в компактный формат при чтении"""
+        try:
+            conn = self.connection
+            records = crypto_manager.get_record_cipher()
+            with self._write_transaction(conn, key_id=records.key_id):
+                # Условие по старому значению защищает от затирания параллельной правки
+                conn.execute(
+                    "UPDATE credentials SET encrypted_password = ? WHERE id = ? AND encrypted_password = ?",
+                    (records.encrypt(password.encode()), credential_id, encrypted_password)
+                )
+        except sqlite3.OperationalError:
+            # База занята - запись обновится при следующем чтении или фоновом проходе
+            pass
+
+    def upgrade_records(self, batch_size: Optional[int] = None) -> int:
+        """Перевести все записи старого формата (Fernet) в компактный формат
+
+        Предназначен для запуска в фоновом потоке после разблокировки.
+        Возвращает количество обновленных записей.
+        """
+        batch_size = batch_size or APP_CONFIG["DB_BATCH_SIZE"]
+        conn = self.connection
+        last_id = upgraded = 0
+
+        while True:
+            page = conn.execute("""
+                SELECT id, encrypted_password FROM credentials
+                WHERE id > ? AND substr(encrypted_password, 1, 1) != x'01'
+                ORDER BY id LIMIT ?
+            """, (last_id, batch_size)).fetchall()
+            if not page:
+                return upgraded
+
+            tokens = [encrypted_password for _, encrypted_password in page]
+            key_id = crypto_manager.get_record_cipher().key_id
+            upgraded_tokens = crypto_manager.reencrypt_many(tokens, parallel=True)
+            with self._write_transaction(conn, key_id=key_id):
+                cursor = conn.executemany(
+                    "UPDATE credentials SET encrypted_password = ? WHERE id = ? AND encrypted_password = ?",
+                    ((new, row_id, old) for (row_id, old), new in zip(page, upgraded_tokens))
+                )
+                upgraded += cursor.rowcount
+            last_id = page[-1][0]
 
     def get_all_credentials(self) -> List[Tuple[str, str]]:
         """Получить список всех сервисов и логинов"""
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
+        if self.encrypted_metadata:
+            return self._metadata_index().items()
+        return self.connection.execute("""
+            SELECT service, login FROM credentials
+            ORDER BY service_fold, service
+        """).fetchall()
+
+    def iter_credentials(self, after: Optional[str] = None,
+                         page_size: Optional[int] = None) -> Iterator[Tuple[str, str]]:
+        """Постранично перебрать пары (service, login) в алфавитном порядке
+
+        Используется пагинация по ключу: каждая страница - отдельный запрос
+        по индексу idx_credentials_service_fold, начиная после сервиса after.
+        """
+        if self.encrypted_metadata:
+            yield from self._metadata_index().iter_after(after)
+            return
+
+        page_size = page_size or APP_CONFIG["LIST_PAGE_SIZE"]
+        while True:
+            if after is None:
+                page = self.connection.execute("""
+                    SELECT service, login FROM credentials
+                    ORDER BY service_fold, service LIMIT ?
+                """, (page_size,)).fetchall()
+            else:
+                page = self.connection.execute("""
+                    SELECT service, login FROM credentials
+                    WHERE service_fold >= ?
+                      AND (service_fold > ? OR service > ?)
+                    ORDER BY service_fold, service LIMIT ?
+                """, (after.casefold(), after.casefold(), after, page_size)).fetchall()
+
+            yield from page
+            if len(page) < page_size:
+                return
+            after = page[-1][0]
+
+    def search_credentials(self, query: str, limit: Optional[int] = None) -> List[Tuple[str, str]]:
+        """Найти записи по подстрокам в сервисе или логине
+
+        Слова запроса объединяются по И и сравниваются без учета регистра
+        (str.casefold, в том числе для кириллицы). Слова от трех символов
+        ищутся по FTS5-индексу с ранжированием bm25, более короткие - через
+        LIKE по свернутым колонкам среди его кандидатов. Сервисы, начинающиеся
+        с первого слова, идут первыми. Запрос только из коротких слов ищет
+        начало сервиса или логина диапазонами по индексам: подстрока из одной-
+        двух букв есть почти в каждой записи, а ее поиск просматривал бы всю
+        таблицу. Без FTS5 подстроки ищутся просмотром таблицы.
+        В режиме шифрования метаданных поиск идет по индексу в памяти.
+        """
+        limit = limit or APP_CONFIG["SEARCH_RESULT_LIMIT"]
+        if self.encrypted_metadata:
+            return self._metadata_index().search(query, limit)
+        terms = query.split()
+        if not terms:
+            return self.connection.execute("""
                 SELECT service, login FROM credentials
-                ORDER BY service COLLATE NOCASE ASC
+                ORDER BY service_fold, service LIMIT ?
+            """, (limit,)).fetchall()
+
+        indexed = [term for term in terms if len(term) >= 3] if self.fts_enabled else []
+        conditions = []
+        params: List[object] = []
+        for term in terms:
+            if term in indexed:
+                continue
+            conditions.append(_LIKE_CONDITION)
+            params.extend(_like_pattern(term) for _ in range(2))
+
+        where = "".join(" AND " + condition for condition in conditions)
+        prefixed = self._prefix_matches("service_fold", terms, limit)
+        if not indexed:
+            rows = prefixed
+            if len(rows) < limit:
+                rows += self._prefix_matches("login_fold", terms, limit)
+            if len(rows) < limit and not self.fts_enabled:
+                rows += self.connection.execute(f"""
+                    SELECT c.service, c.login FROM credentials c WHERE 1{where}
+                    ORDER BY c.service_fold, c.service LIMIT ?
+                """, [*params, limit]).fetchall()
+            return list(dict.fromkeys(rows))[:limit]
+
+        # Ранжируется ограниченный набор кандидатов: для слишком общих
+        # запросов подсчет bm25 по всем совпадениям стоил бы O(N)
+        match = " AND ".join('"' + term.replace('"', '""') + '"' for term in indexed)
+        ranked = self.connection.execute(f"""
+            SELECT c.service, c.login FROM (
+                SELECT credentials_fts.rowid AS id, bm25(credentials_fts, 2.0, 1.0) AS score
+                FROM credentials_fts JOIN credentials c ON c.id = credentials_fts.rowid
+                WHERE credentials_fts MATCH ?{where}
+                LIMIT ?
+            ) r JOIN credentials c ON c.id = r.id
+            ORDER BY r.score, c.service_fold LIMIT ?
+        """, [match, *params, APP_CONFIG["SEARCH_CANDIDATE_LIMIT"], limit]).fetchall()
+
+        # Кандидаты берутся в порядке rowid и могут не включать лучшие
+        # совпадения, поэтому сервисы с началом по первому слову идут первыми
+        seen = set(prefixed)
+        return (prefixed + [row for row in ranked if row not in seen])[:limit]
+
+    def _prefix_matches(self, column: str, terms: List[str], limit: int) -> List[Tuple[str, str]]:
+        """Записи, у которых свернутая колонка column начинается с первого слова
+
+        Выбираются диапазоном по индексу колонки, остальные слова должны
+        встретиться в сервисе или логине.
+        """
+        prefix = terms[0].casefold()
+        return self.connection.execute(f"""
+            SELECT c.service, c.login FROM credentials c
+            WHERE c.{column} >= ? AND c.{column} < ?
+            {"".join(" AND " + _LIKE_CONDITION for _ in terms[1:])}
+            ORDER BY c.{column}, c.service LIMIT ?
+        """, [prefix, prefix + "\uffff",
+              *(_like_pattern(term) for term in terms[1:] for _ in range(2)), limit]).fetchall()
+
+    def fuzzy_search(self, query: str, limit: Optional[int] = None) -> List[Tuple[str, str]]:
+        """Нечеткий поиск с ранжированием по индексу в памяти
+
+        Находит записи по фрагментам ("gh prod" -> "GitHub Prod"), подробности
+        в core.fuzzy_index. Пустой запрос возвращает первые записи по алфавиту.
+        """
+        limit = limit or APP_CONFIG["SEARCH_RESULT_LIMIT"]
+        if not query.strip():
+            return self.search_credentials(query, limit)
+        return self._fuzzy_index().search(query, limit)
+
+    def iter_snapshot(self, page_size: int) -> Iterator[List[Tuple[int, str, str, bytes, Optional[str]]]]:
+        """Постранично прочитать все записи из одного согласованного снимка
+
+        Чтение идет через отдельное соединение в одной транзакции чтения,
+        поэтому параллельные изменения не попадают в середину выгрузки.
+        Возвращает страницы строк (id, service, login, encrypted_password, comment);
+        зашифрованные метаданные расшифровываются.
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN")
+            cursor = conn.execute("""
+                SELECT id, service, login, encrypted_password, comment, encrypted_metadata
+                FROM credentials ORDER BY id
             """)
-            return cursor.fetchall()
+            while True:
+                rows = cursor.fetchmany(page_size)
+                if not rows:
+                    break
+                encrypted = [row for row in rows if row[5] is not None]
+                texts = iter(crypto_manager.decrypt_many((row[5] for row in encrypted), parallel=True))
+                page = []
+                for row in rows:
+                    if row[5] is None:
+                        page.append(row[:5])
+                    else:
+                        metadata = json.loads(next(texts))
+                        page.append((row[0], metadata["service"], metadata["login"], row[3], metadata["comment"]))
+                yield page
+        finally:
+            conn.rollback()
+            conn.close()
 
+    @_retry_locked
+    @_serialised
     def delete_credential(self, credential_id: int) -> None:
         """Удалить учетные данные по ID"""
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM credentials WHERE id = ?", (credential_id,))
-            conn.commit()
+        conn = self.connection
+        with self._write_transaction(conn):
+            previous = self._read_item(conn, credential_id) if self._change_listeners else None
+            conn.execute("DELETE FROM credentials WHERE id = ?", (credential_id,))
+        self._secret_cache.invalidate(credential_id=credential_id)
+        self._update_index(credential_id)
+        if previous is not None:
+            self._notify(Change("deleted", credential_id, None, previous))
 
     def service_exists(self, service: str) -> bool:
         """Проверить существование сервиса в базе"""
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id FROM credentials WHERE service = ?", (service,))
-            return cursor.fetchone() is not None
+        cursor = self.connection.execute("SELECT id FROM credentials WHERE service = ?", (self._service_key(service),))
+        return cursor.fetchone() is not None
+
+
+_db_manager_lock = threading.Lock()
+
 
+def __getattr__(name: str):
+    """Глобальный экземпляр db_manager создается при первом обращении
 
-# Глобальный экземпляр менеджера базы данных
-db_manager = DatabaseManager()
+    Импорт модуля не открывает и не мигрирует хранилище в data/: это важно
+    для замеров и инструментов, работающих с отдельной базой.
+    """
+    if name != "db_manager":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _db_manager_lock:
+        manager = globals().get("db_manager")
+        if manager is None:
+            # Глобальный экземпляр менеджера базы данных
+            manager = globals()["db_manager"] = DatabaseManager()
+    return manager
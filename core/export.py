@@ -0,0 +1,127 @@
+"""Потоковый экспорт хранилища в зашифрованный архив
+
+Формат архива:
+    MAGIC
+    [4 байта длины][содержимое fortress.kdf]
+    [4 байта длины][Fernet-токен сжатой страницы записей] ...
+    [4 нулевых байта]
+
+Страницы сжимаются одним потоком zlib (Z_SYNC_FLUSH), каждая страница
+шифруется ключом данных хранилища. Пароли выгружаются в зашифрованном
+виде, поэтому архив открывается тем же мастер-паролем, что и хранилище.
+"""
+
+import base64
+import json
+import os
+import struct
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional
+
+from config.settings import APP_CONFIG, KDF_PATH
+from core.crypto import crypto_manager
+from core.database import db_manager
+
+MAGIC = b"DFBACKUP1\n"
+_LENGTH = struct.Struct(">I")
+
+
+def _write_frame(f, data: bytes) -> None:
+    """Записать блок с префиксом длины"""
+    f.write(_LENGTH.pack(len(data)))
+    f.write(data)
+
+
+def _read_frame(f) -> bytes:
+    """Прочитать блок с префиксом длины"""
+    header = f.read(_LENGTH.size)
+    if len(header) != _LENGTH.size:
+        raise ValueError("Архив поврежден: неожиданный конец файла")
+    length, = _LENGTH.unpack(header)
+    data = f.read(length)
+    if len(data) != length:
+        raise ValueError("Архив поврежден: неожиданный конец файла")
+    return data
+
+
+def export_vault(path: Path, progress_callback: Optional[Callable[[int], None]] = None,
+                 page_size: Optional[int] = None) -> int:
+    """Выгрузить хранилище в архив, не загружая его целиком в память
+
+    Архив пишется во временный файл и атомарно переименовывается.
+    progress_callback(rows) вызывается после каждой страницы.
+    Возвращает количество выгруженных записей.
+    """
+    path = Path(path)
+    page_size = page_size or APP_CONFIG["EXPORT_PAGE_SIZE"]
+    fernet = crypto_manager.get_cipher()
+    compressor = zlib.compressobj(level=6)
+    tmp_path = path.with_name(path.name + ".tmp")
+    rows = 0
+
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            _write_frame(f, KDF_PATH.read_bytes())
+
+            for page in db_manager.iter_snapshot(page_size):
+                lines = []
+                for _id, service, login, encrypted_password, comment in page:
+                    lines.append(json.dumps({
+                        "service": service,
+                        "login": login,
+                        "encrypted_password": base64.b64encode(encrypted_password).decode("ascii"),
+                        "comment": comment or "",
+                    }, ensure_ascii=False))
+                payload = ("\n".join(lines) + "\n").encode("utf-8")
+                chunk = compressor.compress(payload) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                _write_frame(f, fernet.encrypt(chunk))
+
+                rows += len(page)
+                if progress_callback:
+                    progress_callback(rows)
+
+            _write_frame(f, b"")
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    return rows
+
+
+def read_backup_kdf(path: Path) -> bytes:
+    """Получить ключевую информацию (fortress.kdf), сохраненную в архиве"""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("Файл не является архивом Digital Fortress")
+        return _read_frame(f)
+
+
+def iter_backup(path: Path) -> Iterator[Dict[str, object]]:
+    """Построчно прочитать записи архива
+
+    Требует разблокированного хранилища с тем же ключом данных.
+    Поле encrypted_password возвращается в виде bytes.
+    """
+    fernet = crypto_manager.get_cipher()
+    decompressor = zlib.decompressobj()
+
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("Файл не является архивом Digital Fortress")
+        _read_frame(f)
+
+        while True:
+            frame = _read_frame(f)
+            if not frame:
+                break
+            payload = decompressor.decompress(fernet.decrypt(frame))
+            for line in payload.decode("utf-8").splitlines():
+                record = json.loads(line)
+                record["encrypted_password"] = base64.b64decode(record["encrypted_password"])
+                yield record
@@ -0,0 +1,339 @@
+"""Нечеткий поиск по сервису и логину с триграммным индексом в памяти
+
+Запрос делится на слова, каждое слово должно найтись в сервисе или
+логине. Виды совпадений по убыванию оценки:
+- начало сервиса или логина;
+- подстрока (начало слова дает бонус);
+- подпоследовательность ("gh" -> "GitHub"), начала слов (в том числе
+  переход к заглавной букве) и подряд идущие символы дают бонус, разрывы -
+  штраф;
+- опечатка для слов от трех символов (совпадает не менее половины триграмм).
+
+Кандидаты выбираются по индексу, а не полным перебором:
+- запрос из одного слова, у которого хватает совпадений с началом сервиса,
+  отвечается по отсортированному списку сервисов без оценки остальных;
+- затем оцениваются точные кандидаты: записи с самыми редкими триграммами
+  слова (для коротких слов - с началами слов: первая буква и пары "первая
+  буква + одна из следующих четырех", так "gh" находит "GitHub");
+- если их меньше нужного, добавляются нечеткие кандидаты: записи хотя бы
+  с одной из двух самых редких триграмм слова (опечатка), а для слов из
+  трех символов - и с началом слова по первым двум (пропущенные буквы);
+- если и с ними набралось меньше нужного, а кандидатов от индекса совсем
+  мало (слово короче триграммы или из редких сочетаний), записи ищутся
+  просмотром общего текста всех записей регулярным выражением: подстрока
+  или подпоследовательность самого длинного слова в сервисе или логине (так
+  находятся "ub" -> "GitHub", "ба" -> "Сбербанк", "gthb" -> "GitHub");
+- оценивается не больше candidate_limit кандидатов, при избытке - с самыми
+  короткими названиями сервисов.
+"""
+
+import bisect
+import heapq
+import itertools
+import re
+import threading
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+Item = Tuple[str, str]
+Entry = Tuple[Item, str, str]
+
+_WORD_START = re.compile(r"(?<![^\W_])[^\W_]{1,5}")
+# Вес совпадения в логине относительно совпадения в сервисе
+_LOGIN_WEIGHT = 0.6
+# Подпоследовательность всегда ниже подстроки
+_SUBSEQUENCE_MAX = 39.0
+# Сколько самых редких триграмм слова пересекается при выборе кандидатов
+_EXACT_GRAMS = 3
+# Набор кандидатов такого размера дальше не сужается: дешевле оценить
+_SMALL_SET = 64
+
+
+def _trigrams(text: str) -> Set[Tuple[str, str, str]]:
+    """Триграммы строки (в нижнем регистре)"""
+    return set(zip(text, text[1:], text[2:]))
+
+
+def _short_keys(text: str) -> Set[str]:
+    """Ключи для запросов из одного-двух символов"""
+    words = _WORD_START.findall(text)
+    keys = {word[0] for word in words}
+    keys.update(word[0] + ch for word in words for ch in word[1:])
+    return keys
+
+
+def _is_boundary(cased: str, pos: int) -> bool:
+    """Начинается ли в позиции pos новое слово (строка в исходном регистре)
+
+    Кроме начала после разделителя учитывается переход от строчной буквы
+    к заглавной: "GitHub" состоит из слов "Git" и "Hub".
+    """
+    if pos == 0:
+        return True
+    prev = cased[pos - 1]
+    return not prev.isalnum() or (prev.islower() and cased[pos].isupper())
+
+
+def _score_text(term: str, text: str, cased: str) -> Optional[float]:
+    """Оценка совпадения одного слова запроса со строкой или None
+
+    Поиск идет по text в нижнем регистре, границы слов - по cased.
+    """
+    if len(cased) != len(text):
+        # Смена регистра изменила длину (редкие символы Unicode)
+        cased = text
+    pos = text.find(term)
+    if pos == 0:
+        return 100.0 + len(term)
+    if pos > 0:
+        return 60.0 + (20.0 if _is_boundary(cased, pos) else 0.0) - min(pos, 40) * 0.5
+
+    # Подпоследовательность: символы по порядку, возможно с разрывами
+    score = 20.0
+    prev = -1
+    for ch in term:
+        pos = text.find(ch, prev + 1)
+        if pos < 0:
+            break
+        if _is_boundary(cased, pos):
+            score += 8.0
+        if pos == prev + 1:
+            score += 4.0
+        else:
+            score -= min(pos - prev - 1, 10) * 0.5
+        prev = pos
+    else:
+        return min(score, _SUBSEQUENCE_MAX)
+
+    # Опечатка: достаточно половины триграмм
+    count = len(term) - 2
+    if count > 0:
+        overlap = sum(1 for i in range(count) if term[i:i + 3] in text) / count
+        if overlap >= 0.5:
+            return 10.0 * overlap
+    return None
+
+
+def score(terms: List[str], service: str, login: str, item: Optional[Item] = None) -> Optional[float]:
+    """Оценка записи для слов запроса или None, если запись не подходит
+
+    Слова запроса, сервис и логин передаются в нижнем регистре; item -
+    сервис и логин в исходном регистре для поиска границ слов.
+    """
+    cased_service, cased_login = item or (service, login)
+    total = 0.0
+    for term in terms:
+        best = _score_text(term, service, cased_service)
+        # Логин проверяется, только если может дать больше сервиса
+        if best is None or best < (100.0 + len(term)) * _LOGIN_WEIGHT:
+            in_login = _score_text(term, login, cased_login)
+            if in_login is not None and (best is None or in_login * _LOGIN_WEIGHT > best):
+                best = in_login * _LOGIN_WEIGHT
+        if best is None:
+            return None
+        total += best
+    # При равной оценке выше короткие названия
+    return total - len(service) * 0.01
+
+
+def _rank(terms: List[str], entries: Iterable[Entry], limit: int) -> List[Item]:
+    """Лучшие limit записей из набора (запись, сервис и логин в нижнем регистре)"""
+    scored = []
+    for item, service, login in entries:
+        value = score(terms, service, login, item)
+        if value is not None:
+            scored.append((value, item))
+    return [item for _, item in heapq.nlargest(limit, scored, key=lambda pair: pair[0])]
+
+
+class FuzzyIndex:
+    """Триграммный индекс записей с точечным обновлением"""
+
+    def __init__(self, records: Iterable[Tuple[int, str, str]] = (), candidate_limit: int = 1000):
+        self._lock = threading.Lock()
+        self._candidate_limit = candidate_limit
+        # ID -> ((service, login), service и login в нижнем регистре)
+        self._records: Dict[int, Entry] = {}
+        # Списки ID в массивах: в несколько раз компактнее множеств
+        self._grams: Dict[Tuple[str, str, str], array] = {}
+        self._short: Dict[str, array] = {}
+        # Отсортированные пары (сервис в нижнем регистре, ID) для поиска по началу
+        self._services: List[Tuple[str, int]] = []
+        # Текст для просмотра: строки "сервис\tлогин", их ID и начала;
+        # строится при первом просмотре и сбрасывается при изменениях
+        self._scan_text: Optional[str] = None
+        self._scan_ids: List[int] = []
+        self._scan_starts: List[int] = []
+        # От коротких сервисов к длинным: порядок в списках ID служит приоритетом
+        for credential_id, service, login in sorted(records, key=lambda record: len(record[1])):
+            self._add(credential_id, service, login)
+        self._services.sort()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _add(self, credential_id: int, service: str, login: str) -> None:
+        """Добавить запись в списки индекса (под блокировкой или при построении)"""
+        item = (service, login)
+        service, login = service.lower(), login.lower()
+        self._records[credential_id] = (item, service, login)
+        self._scan_text = None
+        self._services.append((service, credential_id))
+        # Сервис и логин разделены символом, который не встречается в запросе
+        text = service + "\n" + login
+        for table, keys in ((self._grams, _trigrams(text)), (self._short, _short_keys(text))):
+            for key in keys:
+                ids = table.get(key)
+                if ids is None:
+                    ids = table[key] = array("I")
+                ids.append(credential_id)
+
+    def _drop_service(self, credential_id: int) -> Optional[Entry]:
+        """Убрать запись из списка сервисов, вернуть ее прежнее значение"""
+        entry = self._records.get(credential_id)
+        if entry is not None:
+            pos = bisect.bisect_left(self._services, (entry[1], credential_id))
+            if pos < len(self._services) and self._services[pos] == (entry[1], credential_id):
+                del self._services[pos]
+        return entry
+
+    def upsert(self, credential_id: int, service: str, login: str) -> None:
+        """Добавить или обновить запись
+
+        Старые ключи не вычищаются из списков ID: кандидаты всегда проверяются
+        функцией оценки по актуальным данным, а лишние ID лишь немного
+        увеличивают набор кандидатов.
+        """
+        with self._lock:
+            entry = self._records.get(credential_id)
+            if entry is not None and entry[0] == (service, login):
+                return
+            self._drop_service(credential_id)
+            self._add(credential_id, service, login)
+            # _add дописал пару в конец, переносим ее на место
+            self._services.pop()
+            bisect.insort(self._services, (service.lower(), credential_id))
+
+    def remove(self, credential_id: int) -> None:
+        """Удалить запись"""
+        with self._lock:
+            self._drop_service(credential_id)
+            if self._records.pop(credential_id, None) is not None:
+                self._scan_text = None
+
+    def _prefix_matches(self, prefix: str) -> List[Tuple[str, int]]:
+        """Сервисы, начинающиеся с prefix"""
+        start = bisect.bisect_left(self._services, (prefix,))
+        end = bisect.bisect_left(self._services, (prefix + "\uffff",), start)
+        return self._services[start:end]
+
+    def _term_lists(self, term: str, typo: bool) -> Tuple[List[Sequence[int]], bool]:
+        """Списки ID для слова запроса и способ их объединения
+
+        Возвращает списки (от самого редкого) и признак "запись должна быть во
+        всех списках"; иначе достаточно любого из них.
+        """
+        if len(term) < 3:
+            return [self._short.get(term, ())], True
+        lists = sorted((self._grams.get(gram, ()) for gram in _trigrams(term)), key=len)
+        if typo:
+            # Две самые редкие триграммы: одна опечатка не теряет запись.
+            # У слова из трех букв триграмма одна, поэтому добавляются начала
+            # слов по первым двум символам - пропуски букв ("bnk" -> "bank")
+            if len(term) == 3:
+                return lists + [self._short.get(term[:2], ())], False
+            return lists[:2], False
+        # Самых редких триграмм достаточно, остальное проверит функция оценки
+        return lists[:_EXACT_GRAMS], True
+
+    def _candidates(self, terms: List[str], typo: bool, exclude: Set[int] = frozenset()) -> Set[int]:
+        """ID, которые могут подойти под все слова запроса"""
+        groups = [self._term_lists(term, typo) for term in terms]
+        # Начинаем с самого редкого слова, остальные только сужают набор
+        groups.sort(key=lambda group: len(group[0][0]) if group[1] else sum(map(len, group[0])))
+        driver, require_all = groups[0]
+        ids = set(driver[0]) if require_all else set().union(*driver)
+        for index, (lists, require_all) in enumerate(groups):
+            if index == 0 and not require_all:
+                continue
+            for pos, other in enumerate(lists):
+                if not ids or (pos and len(ids) <= _SMALL_SET):
+                    break
+                if index == 0 and pos == 0:
+                    continue
+                if require_all:
+                    ids.intersection_update(other)
+                elif pos == 0:
+                    ids = set().union(*(ids.intersection(other) for other in lists))
+        ids -= exclude
+        if len(ids) <= self._candidate_limit:
+            return ids
+        # Слишком широкий запрос: берем первых по порядку в списках. Индекс
+        # строится от коротких сервисов к длинным, так что это самые короткие.
+        return set(itertools.islice(filter(ids.__contains__, itertools.chain(*driver)), self._candidate_limit))
+
+    def _scan(self, terms: List[str], exclude: Set[int]) -> List[int]:
+        """ID записей, где самое длинное слово - подстрока или подпоследовательность
+
+        Просмотр идет по общему тексту записей (под блокировкой), остальные
+        слова проверит функция оценки.
+        """
+        if self._scan_text is None:
+            lines = []
+            self._scan_ids = []
+            self._scan_starts = []
+            offset = 0
+            for credential_id, (_, service, login) in self._records.items():
+                line = service + "\t" + login
+                lines.append(line)
+                self._scan_ids.append(credential_id)
+                self._scan_starts.append(offset)
+                offset += len(line) + 1
+            self._scan_text = "\n".join(lines)
+
+        term = max(terms, key=len)
+        # Символы по порядку в пределах сервиса или логина: каждый следующий -
+        # ближайшее вхождение, без возвратов. Остаток строки поглощается,
+        # чтобы следующее совпадение искалось уже в другой записи
+        pattern = re.compile(re.escape(term[0]) + "".join(
+            f"[^\t\n{re.escape(ch)}]*{re.escape(ch)}" for ch in term[1:]
+        ) + "[^\n]*")
+        found = []
+        for match in pattern.finditer(self._scan_text):
+            credential_id = self._scan_ids[bisect.bisect_right(self._scan_starts, match.start()) - 1]
+            if credential_id not in exclude:
+                found.append(credential_id)
+                if len(found) >= self._candidate_limit:
+                    break
+        return found
+
+    def _entries(self, ids: Iterable[int]) -> List[Entry]:
+        """Записи по ID (удаленные пропускаются)"""
+        return list(filter(None, map(self._records.get, ids)))
+
+    def search(self, query: str, limit: int) -> List[Item]:
+        """Лучшие limit записей для запроса"""
+        terms = query.lower().split()
+        if not terms:
+            return []
+        with self._lock:
+            if len(terms) == 1:
+                # Начало сервиса дает наивысшую оценку, выше - только более короткие
+                prefixed = self._prefix_matches(terms[0])
+                if len(prefixed) >= limit:
+                    best = heapq.nsmallest(limit, prefixed, key=lambda pair: len(pair[0]))
+                    return [self._records[credential_id][0] for _, credential_id in best]
+
+            exact = self._candidates(terms, typo=False)
+            results = _rank(terms, self._entries(exact), limit)
+            if len(results) >= limit:
+                return results
+            typo = self._candidates(terms, typo=True, exclude=exact)
+            entries = self._entries(typo)
+            rest = _rank(terms, entries, limit - len(results))
+            found = exact | typo
+            if len(results) + len(rest) >= limit or len(found) > _SMALL_SET:
+                return results + rest
+            # Индекс почти ничего не нашел: просматриваем все записи
+            entries += self._entries(self._scan(terms, found))
+        return results + _rank(terms, entries, limit - len(results))
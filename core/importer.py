@@ -0,0 +1,155 @@
+"""Потоковый импорт учетных данных из CSV и JSON Lines
+
+Файл читается построчно и проходит через цепочку генераторов:
+разбор -> нормализация -> разбиение на порции -> шифрование и вставка.
+В памяти одновременно находится не больше одной порции записей.
+Дубликаты по сервису отсеиваются ограничением UNIQUE при массовой вставке.
+"""
+
+import csv
+import json
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlparse
+
+from config.settings import APP_CONFIG
+from core.database import db_manager
+
+Credential = Tuple[str, str, str, str]
+
+# Названия колонок в экспортах браузеров и менеджеров паролей
+SERVICE_FIELDS = ("service", "name", "title", "account")
+URL_FIELDS = ("url", "login_uri", "website", "web site", "origin")
+LOGIN_FIELDS = ("login", "username", "login_username", "login name", "user", "email")
+PASSWORD_FIELDS = ("password", "login_password")
+COMMENT_FIELDS = ("comment", "comments", "note", "notes", "extra")
+
+
+class ImportResult(NamedTuple):
+    """Итог импорта
+
+    malformed - номера строк, которые не удалось разобрать (они пропущены).
+    """
+    imported: int
+    duplicates: int
+    skipped: int
+    malformed: Tuple[int, ...] = ()
+
+
+def read_csv(path: Path, malformed: Optional[List[int]] = None) -> Iterator[Dict[str, str]]:
+    """Построчно прочитать CSV-файл с заголовком
+
+    Ошибки разбора обрабатываются как в read_json_lines.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        while True:
+            try:
+                yield next(reader)
+            except StopIteration:
+                return
+            except csv.Error:
+                if malformed is None:
+                    raise ValueError(f"Строка {reader.line_num}: некорректная запись CSV")
+                malformed.append(reader.line_num)
+
+
+def read_json_lines(path: Path, malformed: Optional[List[int]] = None) -> Iterator[Dict[str, str]]:
+    """Построчно прочитать файл JSON Lines (один объект на строку)
+
+    Номера строк, которые не являются JSON-объектом, добавляются в malformed,
+    а сами строки пропускаются. Без списка malformed такая строка дает
+    ValueError с ее номером.
+    """
+    with open(path, encoding="utf-8-sig") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if isinstance(record, dict):
+                yield record
+            elif malformed is None:
+                raise ValueError(f"Строка {number}: ожидается JSON-объект")
+            else:
+                malformed.append(number)
+
+
+READERS: Dict[str, Callable[[Path, Optional[List[int]]], Iterator[Dict[str, str]]]] = {
+    "csv": read_csv,
+    "jsonl": read_json_lines,
+}
+
+
+def _pick(record: Dict[str, str], fields: Iterable[str]) -> str:
+    """Вернуть первое непустое значение из списка возможных колонок"""
+    for field in fields:
+        value = record.get(field)
+        if value:
+            return str(value).strip()
+    return ""
+
+
+def normalise(records: Iterable[Dict[str, str]]) -> Iterator[Optional[Credential]]:
+    """Привести записи к виду (service, login, password, comment)
+
+    Для записей без сервиса или пароля возвращается None.
+    """
+    for record in records:
+        record = {str(k).strip().lower(): v for k, v in record.items() if k is not None}
+
+        service = _pick(record, SERVICE_FIELDS)
+        if not service:
+            url = _pick(record, URL_FIELDS)
+            service = urlparse(url).hostname or url if url else ""
+
+        password = _pick(record, PASSWORD_FIELDS)
+        if not service or not password:
+            yield None
+            continue
+
+        yield service, _pick(record, LOGIN_FIELDS), password, _pick(record, COMMENT_FIELDS)
+
+
+def import_file(path: Path, fmt: Optional[str] = None,
+                progress_callback: Optional[Callable[[int, int], None]] = None,
+                chunk_size: Optional[int] = None) -> ImportResult:
+    """Импортировать файл экспорта в базу порциями ограниченного размера
+
+    progress_callback(processed, imported) вызывается после каждой порции.
+    Строки, которые не удалось разобрать, не прерывают импорт: их номера
+    возвращаются в ImportResult.malformed.
+    """
+    path = Path(path)
+    fmt = fmt or ("csv" if path.suffix.lower() == ".csv" else "jsonl")
+    if fmt not in READERS:
+        raise ValueError(f"Неподдерживаемый формат импорта: {fmt}")
+
+    chunk_size = chunk_size or APP_CONFIG["IMPORT_CHUNK_SIZE"]
+    malformed: List[int] = []
+    rows = normalise(READERS[fmt](path, malformed))
+    processed = imported = duplicates = skipped = 0
+
+    while True:
+        chunk: List[Optional[Credential]] = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+
+        valid = [row for row in chunk if row is not None]
+        skipped += len(chunk) - len(valid)
+
+        added, conflicts = db_manager.save_credentials_many(valid)
+        imported += added
+        duplicates += len(conflicts)
+        processed += len(chunk)
+
+        if progress_callback:
+            progress_callback(processed, imported)
+
+    if imported:
+        db_manager.checkpoint()
+    return ImportResult(imported, duplicates, skipped, tuple(malformed))
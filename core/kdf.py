@@ -0,0 +1,124 @@
+"""Функции формирования ключа из мастер-пароля и формат файла fortress.kdf
+
+Формат файла версии 2:
+    MAGIC | версия (1 байт) | длина заголовка (2 байта) | JSON-заголовок | зашифрованный ключ данных
+
+Заголовок содержит алгоритм и его параметры, например
+{"kdf": "scrypt", "salt": "...", "n": 131072, "r": 8, "p": 1}.
+Файлы версии 1 (соль + токен без заголовка) читаются как PBKDF2-SHA256
+с числом итераций PBKDF2_ITERATIONS.
+"""
+
+import base64
+import json
+import math
+import os
+import struct
+import time
+from typing import Any, Dict, Tuple
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+
+from config.settings import APP_CONFIG
+
+MAGIC = b"DFKDF"
+FORMAT_VERSION = 2
+_HEADER_LENGTH = struct.Struct(">H")
+
+KdfParams = Dict[str, Any]
+
+
+def derive_key(password: str, params: KdfParams) -> bytes:
+    """Получить 32-байтовый мастер-ключ по параметрам из заголовка"""
+    salt = base64.b64decode(params["salt"])
+    if params["kdf"] == "scrypt":
+        kdf = Scrypt(salt=salt, length=32, n=params["n"], r=params["r"], p=params["p"])
+    elif params["kdf"] == "pbkdf2":
+        kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=params["iterations"])
+    else:
+        raise ValueError(f"Неизвестный алгоритм KDF: {params['kdf']}")
+    return kdf.derive(password.encode())
+
+
+def _time_derivation(params: KdfParams) -> float:
+    """Замерить время одной деривации в секундах"""
+    start = time.perf_counter()
+    derive_key("calibration", params)
+    return time.perf_counter() - start
+
+
+def calibrate(algorithm: str, target_ms: float) -> KdfParams:
+    """Подобрать параметры KDF под целевое время разблокировки на этой машине
+
+    Выполняется пробная деривация с минимальными параметрами, затем работа
+    масштабируется линейно. Для scrypt число n округляется вниз до степени
+    двойки и ограничивается KDF_MAX_MEMORY_MB.
+    """
+    target = target_ms / 1000
+    salt = base64.b64encode(os.urandom(APP_CONFIG["SALT_SIZE"])).decode("ascii")
+
+    if algorithm == "scrypt":
+        r, p = 8, 1
+        min_n = APP_CONFIG["SCRYPT_MIN_N"]
+        max_n = APP_CONFIG["KDF_MAX_MEMORY_MB"] * 1024 * 1024 // (128 * r)
+        elapsed = _time_derivation({"kdf": "scrypt", "salt": salt, "n": min_n, "r": r, "p": p})
+        scale = max(1.0, target / max(elapsed, 1e-6))
+        n = 1 << int(math.log2(min_n * scale))
+        n = max(min_n, min(n, 1 << int(math.log2(max_n))))
+        return {"kdf": "scrypt", "salt": salt, "n": n, "r": r, "p": p}
+
+    if algorithm == "pbkdf2":
+        min_iterations = APP_CONFIG["PBKDF2_ITERATIONS"]
+        probe = 50_000
+        elapsed = _time_derivation({"kdf": "pbkdf2", "salt": salt, "iterations": probe})
+        iterations = int(probe * target / max(elapsed, 1e-6))
+        return {"kdf": "pbkdf2", "salt": salt, "iterations": max(min_iterations, iterations)}
+
+    raise ValueError(f"Неизвестный алгоритм KDF: {algorithm}")
+
+
+def pack(params: KdfParams, encrypted_data_key: bytes) -> bytes:
+    """Собрать содержимое файла fortress.kdf текущей версии"""
+    header = json.dumps(params, sort_keys=True).encode("utf-8")
+    return MAGIC + bytes([FORMAT_VERSION]) + _HEADER_LENGTH.pack(len(header)) + header + encrypted_data_key
+
+
+def unpack(data: bytes) -> Tuple[int, KdfParams, bytes]:
+    """Разобрать файл fortress.kdf
+
+    Возвращает (версия формата, параметры KDF, зашифрованный ключ данных).
+    Усеченный или поврежденный файл дает ValueError.
+    """
+    if not data.startswith(MAGIC):
+        salt_size = APP_CONFIG["SALT_SIZE"]
+        if len(data) <= salt_size:
+            raise ValueError("Файл ключа поврежден")
+        params = {
+            "kdf": "pbkdf2",
+            "salt": base64.b64encode(data[:salt_size]).decode("ascii"),
+            "iterations": APP_CONFIG["PBKDF2_ITERATIONS"],
+        }
+        return 1, params, data[salt_size:]
+
+    offset = len(MAGIC)
+    if len(data) < offset + 1 + _HEADER_LENGTH.size:
+        raise ValueError("Файл ключа поврежден")
+    version = data[offset]
+    if version > FORMAT_VERSION:
+        raise ValueError(f"Файл ключа создан более новой версией программы (v{version})")
+    offset += 1
+    length, = _HEADER_LENGTH.unpack_from(data, offset)
+    offset += _HEADER_LENGTH.size
+    if len(data) <= offset + length:
+        raise ValueError("Файл ключа поврежден")
+    params = json.loads(data[offset:offset + length].decode("utf-8"))
+    if not isinstance(params, dict):
+        raise ValueError("Файл ключа поврежден")
+    return version, params, data[offset + length:]
+
+
+def needs_upgrade(version: int, params: KdfParams) -> bool:
+    """Нужно ли перевыпустить файл ключа с актуальным алгоритмом"""
+    return version < FORMAT_VERSION or params.get("kdf") != APP_CONFIG["KDF_ALGORITHM"]
@@ -0,0 +1,104 @@
+"""Индекс расшифрованных метаданных в памяти
+
+Используется в режиме шифрования метаданных, когда сервис и логин
+хранятся в базе только в зашифрованном виде. Индекс строится один раз
+после разблокировки и дальше обновляется точечно при сохранении и удалении,
+поэтому сортировка и поиск не требуют расшифровки записей. Если записи
+изменил другой процесс, DatabaseManager строит индекс заново.
+"""
+
+import bisect
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+def sort_key(service: str) -> Tuple[str, str]:
+    """Ключ сортировки без учета регистра, как ORDER BY service_fold, service в базе
+
+    Базу и списки в памяти упорядочивает одна и та же свертка str.casefold:
+    COLLATE NOCASE сворачивает только латиницу, и кириллица в нем сортируется
+    иначе, чем в Python.
+    """
+    return service.casefold(), service
+
+
+class MetadataIndex:
+    """Отсортированный список (service, login) с поиском по подстрокам"""
+
+    def __init__(self, records: Iterable[Tuple[int, str, str]] = ()):
+        self._lock = threading.Lock()
+        self._records: Dict[int, Tuple[str, str]] = {}
+        self._order: List[Tuple[str, str, int]] = []
+        for credential_id, service, login in records:
+            self._records[credential_id] = (service, login)
+        self._order = sorted(sort_key(service) + (credential_id,)
+                             for credential_id, (service, _) in self._records.items())
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def upsert(self, credential_id: int, service: str, login: str) -> None:
+        """Добавить или обновить запись"""
+        with self._lock:
+            self._remove(credential_id)
+            self._records[credential_id] = (service, login)
+            bisect.insort(self._order, sort_key(service) + (credential_id,))
+
+    def remove(self, credential_id: int) -> None:
+        """Удалить запись по ID"""
+        with self._lock:
+            self._remove(credential_id)
+
+    def _remove(self, credential_id: int) -> None:
+        """Удалить запись (вызывается под блокировкой)"""
+        record = self._records.pop(credential_id, None)
+        if record is None:
+            return
+        key = sort_key(record[0]) + (credential_id,)
+        position = bisect.bisect_left(self._order, key)
+        if position < len(self._order) and self._order[position] == key:
+            del self._order[position]
+
+    def records(self) -> List[Tuple[int, str, str]]:
+        """Все записи (id, service, login) без упорядочивания"""
+        with self._lock:
+            return [(credential_id, service, login) for credential_id, (service, login) in self._records.items()]
+
+    def items(self) -> List[Tuple[str, str]]:
+        """Все пары (service, login) в алфавитном порядке"""
+        with self._lock:
+            return [self._records[credential_id] for _, _, credential_id in self._order]
+
+    def iter_after(self, after: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+        """Перебрать пары (service, login), начиная после сервиса after"""
+        with self._lock:
+            position = 0 if after is None else bisect.bisect_right(self._order, sort_key(after) + (float("inf"),))
+            ids = [credential_id for _, _, credential_id in self._order[position:]]
+        for credential_id in ids:
+            record = self._records.get(credential_id)
+            if record is not None:
+                yield record
+
+    def search(self, query: str, limit: int) -> List[Tuple[str, str]]:
+        """Найти записи, где каждое слово запроса входит в сервис или логин
+
+        Записи, сервис которых начинается с первого слова, идут первыми.
+        """
+        terms = query.casefold().split()
+        if not terms:
+            return self.items()[:limit]
+
+        prefix_matches: List[Tuple[str, str]] = []
+        other_matches: List[Tuple[str, str]] = []
+        with self._lock:
+            for service_fold, _, credential_id in self._order:
+                service, login = self._records[credential_id]
+                login_fold = login.casefold()
+                if all(term in service_fold or term in login_fold for term in terms):
+                    if service_fold.startswith(terms[0]):
+                        prefix_matches.append((service, login))
+                        if len(prefix_matches) >= limit:
+                            break
+                    elif len(other_matches) < limit:
+                        other_matches.append((service, login))
+        return (prefix_matches + other_matches)[:limit]
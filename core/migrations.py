@@ -0,0 +1,200 @@
+"""Версионированные миграции схемы базы данных
+
+Текущая версия схемы хранится в PRAGMA user_version. Каждая миграция
+выполняется ровно один раз в собственной транзакции вместе с увеличением
+версии, поэтому при обычном запуске достаточно прочитать одно число.
+Новые миграции добавляются только в конец списка MIGRATIONS.
+"""
+
+import sqlite3
+from typing import Callable, List
+
+
+def _create_credentials(conn: sqlite3.Connection) -> None:
+    """Создать таблицу учетных данных"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS credentials (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            service TEXT NOT NULL UNIQUE,
+            login TEXT NOT NULL,
+            encrypted_password BLOB NOT NULL,
+            comment TEXT
+        )
+    """)
+
+    # Хранилища первых версий создавались без колонки comment
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(credentials)")]
+    if "comment" not in columns:
+        conn.execute("ALTER TABLE credentials ADD COLUMN comment TEXT")
+
+
+def _create_sort_index(conn: sqlite3.Connection) -> None:
+    """Индекс для сортировки без учета регистра и постраничного вывода"""
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_credentials_service_nocase
+        ON credentials (service COLLATE NOCASE, service)
+    """)
+
+
+def _create_search_index(conn: sqlite3.Connection) -> None:
+    """Триграммный FTS5-индекс по сервису и логину, поддерживаемый триггерами
+
+    Если сборка SQLite не поддерживает FTS5 или триграммный токенайзер,
+    индекс не создается и поиск работает через LIKE.
+    """
+    try:
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS credentials_fts USING fts5(
+                service, login,
+                content='credentials', content_rowid='id', tokenize='trigram'
+            )
+        """)
+    except sqlite3.OperationalError:
+        return
+
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS credentials_fts_insert AFTER INSERT ON credentials BEGIN
+            INSERT INTO credentials_fts(rowid, service, login)
+            VALUES (new.id, new.service, new.login);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS credentials_fts_delete AFTER DELETE ON credentials BEGIN
+            INSERT INTO credentials_fts(credentials_fts, rowid, service, login)
+            VALUES ('delete', old.id, old.service, old.login);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS credentials_fts_update AFTER UPDATE OF service, login ON credentials BEGIN
+            INSERT INTO credentials_fts(credentials_fts, rowid, service, login)
+            VALUES ('delete', old.id, old.service, old.login);
+            INSERT INTO credentials_fts(rowid, service, login)
+            VALUES (new.id, new.service, new.login);
+        END
+    """)
+    conn.execute("INSERT INTO credentials_fts(credentials_fts) VALUES ('rebuild')")
+
+
+def _create_rotation_tables(conn: sqlite3.Connection) -> None:
+    """Таблицы состояния ротации ключа данных и перешифрованных паролей"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS key_rotation (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            kdf_file BLOB NOT NULL,
+            state TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS credentials_rotated (
+            id INTEGER PRIMARY KEY,
+            source BLOB NOT NULL,
+            encrypted_password BLOB NOT NULL
+        )
+    """)
+
+
+def _add_encrypted_metadata(conn: sqlite3.Connection) -> None:
+    """Колонки и настройки режима шифрования метаданных"""
+    conn.execute("ALTER TABLE credentials ADD COLUMN encrypted_metadata BLOB")
+    conn.execute("ALTER TABLE credentials_rotated ADD COLUMN service TEXT")
+    conn.execute("ALTER TABLE credentials_rotated ADD COLUMN encrypted_metadata BLOB")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS vault_settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    """)
+
+
+def _add_change_counter(conn: sqlite3.Connection) -> None:
+    """Счетчик изменений записей для сброса кэшей других процессов
+
+    Триггеры увеличивают счетчик при любой вставке, изменении и удалении,
+    в том числе из другого процесса, поэтому процесс с кэшами в памяти
+    может одним запросом проверить, что хранилище не менялось.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS vault_changes (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            counter INTEGER NOT NULL
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO vault_changes (id, counter) VALUES (1, 0)")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS credentials_changes_{event.lower()} AFTER {event} ON credentials BEGIN
+                UPDATE vault_changes SET counter = counter + 1 WHERE id = 1;
+            END
+        """)
+
+
+def _add_folded_columns(conn: sqlite3.Connection) -> None:
+    """Сервис и логин в нижнем регистре (str.casefold) для поиска коротких слов
+
+    LIKE и COLLATE NOCASE в SQLite не различают регистр только для латиницы,
+    поэтому свертка выполняется в Python при записи. Индексы по свернутым
+    колонкам позволяют искать по началу сервиса или логина диапазоном.
+    В режиме шифрования метаданных колонки пустые.
+    """
+    conn.execute("ALTER TABLE credentials ADD COLUMN service_fold TEXT")
+    conn.execute("ALTER TABLE credentials ADD COLUMN login_fold TEXT")
+    encrypted = conn.execute(
+        "SELECT 1 FROM vault_settings WHERE key = 'encrypted_metadata' AND value = '1'"
+    ).fetchone()
+    if not encrypted:
+        conn.executemany(
+            "UPDATE credentials SET service_fold = ?, login_fold = ? WHERE id = ?",
+            ((service.casefold(), login.casefold(), credential_id)
+             for credential_id, service, login in conn.execute("SELECT id, service, login FROM credentials").fetchall())
+        )
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_credentials_service_fold
+        ON credentials (service_fold, service)
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_credentials_login_fold ON credentials (login_fold)")
+
+
+def _drop_nocase_index(conn: sqlite3.Connection) -> None:
+    """Удалить индекс NOCASE: списки сортируются по service_fold"""
+    conn.execute("DROP INDEX IF EXISTS idx_credentials_service_nocase")
+
+
+# Порядок миграций определяет номер версии схемы - не переставлять
+MIGRATIONS: List[Callable[[sqlite3.Connection], None]] = [
+    _create_credentials,
+    _create_sort_index,
+    _create_search_index,
+    _create_rotation_tables,
+    _add_encrypted_metadata,
+    _add_change_counter,
+    _add_folded_columns,
+    _drop_nocase_index,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Прочитать версию схемы из файла базы"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Применить недостающие миграции и вернуть итоговую версию схемы"""
+    version = get_schema_version(conn)
+    if version >= SCHEMA_VERSION:
+        return version
+
+    while version < SCHEMA_VERSION:
+        with conn:
+            # Блокировка записи и повторное чтение версии защищают от
+            # одновременной миграции из нескольких процессов
+            conn.execute("BEGIN IMMEDIATE")
+            version = get_schema_version(conn)
+            if version >= SCHEMA_VERSION:
+                break
+            MIGRATIONS[version](conn)
+            version += 1
+            conn.execute(f"PRAGMA user_version = {version}")
+
+    return version
@@ -0,0 +1,159 @@
+"""Ротация ключа данных с полным перешифрованием паролей
+
+Порядок работы:
+1. Новый ключ данных шифруется мастер-ключом, содержимое будущего файла
+   fortress.kdf сохраняется в таблице key_rotation (state = 'running').
+2. Пароли (и зашифрованные метаданные вместе с HMAC-индексом сервиса)
+   порциями перешифровываются пулом потоков в теневую таблицу
+   credentials_rotated. Каждая порция фиксируется отдельно и служит
+   контрольной точкой: прерванная ротация продолжается с последней порции.
+3. В одной транзакции с блокировкой записи дообрабатываются строки,
+   измененные или добавленные во время ротации, пароли подменяются
+   из теневой таблицы, в vault_settings записывается отпечаток нового
+   ключа, а состояние меняется на 'committed'.
+4. Записывается новый файл ключа, сессия переключается на новый ключ,
+   кэш расшифрованных записей очищается. Шаги 3-4 выполняются под
+   блокировкой записи db_manager, поэтому потоки этого процесса не могут
+   сохранить запись между фиксацией и сменой ключа. Затем очищаются
+   служебные таблицы. Если процесс прервется после фиксации,
+   DatabaseManager.setup_database допишет файл ключа при следующем запуске.
+
+Другие процессы, открывшие хранилище, сверяют отпечаток ключа в каждой
+транзакции записи (DatabaseManager._check_data_key): после фиксации их
+запись старым ключом отклоняется, а сессия блокируется до повторного входа.
+"""
+
+import json
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from cryptography.fernet import Fernet, InvalidToken
+
+from config.settings import APP_CONFIG
+from core.crypto import RecordCipher, crypto_manager
+from core.database import db_manager
+
+
+def _rotate_metadata(metadata: Sequence[Optional[bytes]],
+                     new_records: RecordCipher) -> List[Tuple[Optional[str], Optional[bytes]]]:
+    """Перешифровать метаданные и пересчитать HMAC-индекс сервиса на новом ключе
+
+    Для записей без зашифрованных метаданных возвращается (None, None).
+    """
+    encrypted = [token for token in metadata if token is not None]
+    texts = iter(crypto_manager.decrypt_many(encrypted, parallel=True))
+    result: List[Tuple[Optional[str], Optional[bytes]]] = []
+    for token in metadata:
+        if token is None:
+            result.append((None, None))
+            continue
+        text = next(texts)
+        service = json.loads(text)["service"]
+        result.append((new_records.blind_index(service), new_records.encrypt(text.encode("utf-8"))))
+    return result
+
+
+def rotate_data_key(password: str, progress_callback: Optional[Callable[[int, int], None]] = None,
+                    chunk_size: Optional[int] = None) -> int:
+    """Сгенерировать новый ключ данных и перешифровать им все пароли
+
+    progress_callback(обработано, всего) вызывается после каждой порции.
+    Возвращает количество перешифрованных записей.
+    """
+    if not crypto_manager.verify_password(password):
+        raise ValueError("Неверный мастер-пароль")
+
+    chunk_size = chunk_size or APP_CONFIG["ROTATION_CHUNK_SIZE"]
+    conn = db_manager.connection
+    insert_rotated = """
+        INSERT OR REPLACE INTO credentials_rotated (id, source, encrypted_password, service, encrypted_metadata)
+        VALUES (?, ?, ?, ?, ?)
+    """
+
+    # Продолжаем прерванную ротацию или начинаем новую
+    row = conn.execute("SELECT kdf_file FROM key_rotation WHERE state = 'running'").fetchone()
+    if row:
+        kdf_file = row[0]
+        try:
+            new_key, _ = crypto_manager.unwrap_data_key(password, kdf_file)
+        except InvalidToken:
+            raise ValueError("Прерванная ротация начата с другим мастер-паролем")
+    else:
+        new_key = Fernet.generate_key()
+        kdf_file = crypto_manager.wrap_data_key(password, new_key)
+        with conn:
+            conn.execute("DELETE FROM credentials_rotated")
+            conn.execute("INSERT INTO key_rotation (id, kdf_file, state) VALUES (1, ?, 'running')", (kdf_file,))
+    new_records = RecordCipher(new_key)
+
+    total = conn.execute("SELECT COUNT(*) FROM credentials").fetchone()[0]
+    done = conn.execute("SELECT COUNT(*) FROM credentials_rotated").fetchone()[0]
+    last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM credentials_rotated").fetchone()[0]
+
+    # Перешифровываем порциями; каждая зафиксированная порция - контрольная точка
+    while True:
+        page = conn.execute("""
+            SELECT id, encrypted_password, encrypted_metadata FROM credentials
+            WHERE id > ? ORDER BY id LIMIT ?
+        """, (last_id, chunk_size)).fetchall()
+        if not page:
+            break
+
+        sources = [encrypted_password for _, encrypted_password, _ in page]
+        rotated = crypto_manager.reencrypt_many(sources, new_key, parallel=True)
+        metadata = _rotate_metadata([row[2] for row in page], new_records)
+        with conn:
+            conn.executemany(insert_rotated, (
+                (row_id, source, new, *meta)
+                for (row_id, source, _), new, meta in zip(page, rotated, metadata)
+            ))
+
+        last_id = page[-1][0]
+        done += len(page)
+        if progress_callback:
+            progress_callback(min(done, total), total)
+
+    # Запись под _write_lock до переключения сессии: иначе поток этого
+    # процесса успел бы зашифровать запись старым, уже выброшенным ключом
+    with db_manager._write_lock:
+        # Атомарная подмена вместе с записью нового ключа в key_rotation
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            stale = conn.execute("""
+                SELECT c.id, c.encrypted_password, c.encrypted_metadata FROM credentials c
+                LEFT JOIN credentials_rotated r ON r.id = c.id
+                WHERE r.id IS NULL OR r.source != c.encrypted_password
+            """).fetchall()
+            if stale:
+                rotated = crypto_manager.reencrypt_many([row[1] for row in stale], new_key, parallel=True)
+                metadata = _rotate_metadata([row[2] for row in stale], new_records)
+                conn.executemany(insert_rotated, (
+                    (row_id, source, new, *meta)
+                    for (row_id, source, _), new, meta in zip(stale, rotated, metadata)
+                ))
+            conn.execute("""
+                UPDATE credentials SET (encrypted_password, service, encrypted_metadata) = (
+                    SELECT r.encrypted_password,
+                           COALESCE(r.service, credentials.service),
+                           COALESCE(r.encrypted_metadata, credentials.encrypted_metadata)
+                    FROM credentials_rotated r WHERE r.id = credentials.id
+                )
+                WHERE id IN (SELECT id FROM credentials_rotated)
+            """)
+            conn.execute(
+                "INSERT OR REPLACE INTO vault_settings (key, value) VALUES ('data_key_id', ?)",
+                (new_records.key_id,)
+            )
+            conn.execute("UPDATE key_rotation SET state = 'committed'")
+            count = conn.execute("SELECT COUNT(*) FROM credentials").fetchone()[0]
+
+        # Записываем новый файл ключа и переключаем сессию на новый ключ
+        crypto_manager.write_kdf_file(kdf_file)
+        crypto_manager.decrypted_key = new_key
+        db_manager._secret_cache.clear()
+    with conn:
+        conn.execute("DELETE FROM credentials_rotated")
+        conn.execute("DELETE FROM key_rotation")
+    # Все страницы переписаны: переносим разросшийся журнал в файл базы
+    db_manager.checkpoint()
+
+    return count
@@ -0,0 +1,336 @@
+"""Локальный JSON-RPC 2.0 сервер для выдачи секретов другим сервисам
+
+Транспорт: Unix-сокет (права 0600) или TCP только на loopback, одно сообщение
+JSON на строку. Соединение постоянное: клиент может отправлять запросы
+один за другим, не переподключаясь. Поддерживаются пакетные запросы
+(JSON-массив) и метод get_many для выборки нескольких сервисов за вызов.
+
+Первым вызовом на соединении должен быть auth с токеном сервера:
+    {"jsonrpc": "2.0", "id": 1, "method": "auth", "params": {"token": "..."}}
+
+Методы: auth, ping, get, get_many, list, search.
+
+Сетевой ввод-вывод обслуживает цикл asyncio, а обращения к SQLite и
+расшифровка выполняются через AsyncVault в пуле из RPC_WORKERS потоков
+(у каждого свое соединение с базой), поэтому медленный запрос не блокирует
+остальных клиентов.
+
+Частота вызовов ограничивается алгоритмом token bucket для каждого клиента:
+- на Unix-сокете клиент - процесс (pid из SO_PEERCRED), поэтому
+  переподключение не сбрасывает его бюджет;
+- на TCP клиент - соединение, а новые соединения ограничиваются общим
+  лимитом RPC_TCP_CONNECT_RATE: переподключение ради нового бюджета стоит
+  дороже, чем работа в уже открытом соединении;
+- попытки auth учитываются отдельно (RPC_AUTH_RATE), так что перебор
+  токена не тратит бюджет вызовов и не мешает другим клиентам.
+"""
+
+import asyncio
+import hmac
+import ipaddress
+import json
+import os
+import secrets
+import socket
+import struct
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import APP_CONFIG
+from core.async_vault import AsyncVault
+
+# Коды ошибок JSON-RPC
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+UNAUTHORIZED = -32001
+RATE_LIMITED = -32002
+
+
+class RpcError(Exception):
+    """Ошибка вызова с кодом JSON-RPC"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+def load_or_create_token(path: Path) -> str:
+    """Прочитать токен сервера или создать новый (файл с правами 0600)"""
+    try:
+        return path.read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        pass
+    token = secrets.token_urlsafe(32)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(token)
+    return token
+
+
+def is_loopback(host: str) -> bool:
+    """Является ли адрес loopback-интерфейсом (localhost, 127.0.0.0/8, ::1)"""
+    if host.lower() == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host.strip("[]")).is_loopback
+    except ValueError:
+        return False
+
+
+class RateLimiter:
+    """Token bucket: rate вызовов в секунду с запасом burst"""
+
+    def __init__(self, rate: float, burst: float):
+        self._rate = rate
+        self._burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def allow(self) -> bool:
+        """Списать один вызов, если лимит позволяет"""
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    def full(self) -> bool:
+        """Восстановился ли запас полностью (такой лимит можно забыть)"""
+        self._refill()
+        return self._tokens >= self._burst
+
+
+class _Peer:
+    """Лимиты одного клиента и число его открытых соединений"""
+
+    __slots__ = ("calls", "auth", "connections")
+
+    def __init__(self, rate: float, burst: float):
+        self.calls = RateLimiter(rate, burst)
+        self.auth = RateLimiter(APP_CONFIG["RPC_AUTH_RATE"], APP_CONFIG["RPC_AUTH_BURST"])
+        self.connections = 0
+
+
+def _peer_key(writer: asyncio.StreamWriter) -> Tuple[Any, ...]:
+    """Ключ клиента: pid процесса на Unix-сокете, иначе само соединение"""
+    sock = writer.get_extra_info("socket")
+    peercred = getattr(socket, "SO_PEERCRED", None)
+    if sock is not None and peercred is not None and sock.family == getattr(socket, "AF_UNIX", None):
+        try:
+            creds = sock.getsockopt(socket.SOL_SOCKET, peercred, struct.calcsize("3i"))
+        except OSError:
+            pass
+        else:
+            pid, _uid, _gid = struct.unpack("3i", creds)
+            return ("pid", pid)
+    return ("connection", id(writer))
+
+
+class RpcServer:
+    """JSON-RPC сервер поверх AsyncVault"""
+
+    def __init__(self, token: str, db=None, workers: Optional[int] = None,
+                 rate_limit: Optional[float] = None, rate_burst: Optional[float] = None):
+        self._vault = AsyncVault(db, read_workers=workers or APP_CONFIG["RPC_WORKERS"])
+        self._token = token.encode("utf-8")
+        self._rate_limit = rate_limit or APP_CONFIG["RPC_RATE_LIMIT"]
+        self._rate_burst = rate_burst or APP_CONFIG["RPC_RATE_BURST"]
+        self._peers: Dict[Tuple[Any, ...], _Peer] = {}
+        self._tcp_connects = RateLimiter(APP_CONFIG["RPC_TCP_CONNECT_RATE"], APP_CONFIG["RPC_TCP_CONNECT_BURST"])
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._methods = {
+            "ping": self._ping,
+            "get": self._get,
+            "get_many": self._get_many,
+            "list": self._list,
+            "search": self._search,
+        }
+
+    async def start_unix(self, path: Path) -> None:
+        """Слушать Unix-сокет, доступный только владельцу"""
+        path = Path(path)
+        path.unlink(missing_ok=True)
+        old_umask = os.umask(0o177)
+        try:
+            self._server = await asyncio.start_unix_server(
+                self._handle_client, str(path), limit=APP_CONFIG["RPC_MAX_MESSAGE_BYTES"]
+            )
+        finally:
+            os.umask(old_umask)
+        os.chmod(path, 0o600)
+
+    async def start_tcp(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """Слушать TCP-порт на loopback; возвращает фактический номер порта"""
+        if not is_loopback(host):
+            raise ValueError(f"TCP-сервер слушает только loopback, а не {host!r}")
+        self._server = await asyncio.start_server(
+            self._handle_tcp_client, host, port, limit=APP_CONFIG["RPC_MAX_MESSAGE_BYTES"]
+        )
+        return self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        """Обслуживать клиентов до отмены задачи"""
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        """Остановить прием соединений и пулы хранилища"""
+        if self._server is not None:
+            self._server.close()
+        await self._vault.close()
+
+    async def _handle_tcp_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Принять TCP-соединение, если не превышен лимит новых соединений"""
+        if not self._tcp_connects.allow():
+            writer.close()
+            return
+        await self._handle_client(reader, writer)
+
+    def _attach_peer(self, writer: asyncio.StreamWriter) -> Tuple[Tuple[Any, ...], _Peer]:
+        """Найти или завести лимиты клиента соединения"""
+        # Забываем клиентов без соединений, чьи лимиты уже восстановились
+        for key in [key for key, peer in self._peers.items() if not peer.connections and peer.calls.full()
+                    and peer.auth.full()]:
+            del self._peers[key]
+        key = _peer_key(writer)
+        peer = self._peers.get(key)
+        if peer is None:
+            peer = self._peers[key] = _Peer(self._rate_limit, self._rate_burst)
+        peer.connections += 1
+        return key, peer
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Обработать запросы одного соединения"""
+        key, peer = self._attach_peer(writer)
+        session = {"authenticated": False, "peer": peer}
+        try:
+            while True:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), APP_CONFIG["RPC_IDLE_TIMEOUT"])
+                except (asyncio.TimeoutError, ValueError, asyncio.LimitOverrunError):
+                    # Простой или слишком длинное сообщение - закрываем соединение
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+
+                response = await self._handle_message(line, session)
+                if response is not None:
+                    writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            peer.connections -= 1
+            if key[0] == "connection":
+                # Ключ соединения больше не встретится
+                del self._peers[key]
+            writer.close()
+
+    async def _handle_message(self, line: bytes, session: Dict[str, Any]) -> Any:
+        """Разобрать сообщение (одиночный вызов или пакет) и вернуть ответ"""
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return self._error(None, PARSE_ERROR, "Некорректный JSON")
+
+        if isinstance(message, list):
+            if not message:
+                return self._error(None, INVALID_REQUEST, "Пустой пакет")
+            if len(message) > APP_CONFIG["RPC_MAX_BATCH"]:
+                return self._error(None, INVALID_REQUEST, f"Пакет больше {APP_CONFIG['RPC_MAX_BATCH']} вызовов")
+            # auth внутри пакета должен выполниться раньше остальных вызовов
+            responses = [await self._handle_call(call, session)
+                         for call in message if isinstance(call, dict) and call.get("method") == "auth"]
+            responses += await asyncio.gather(*(
+                self._handle_call(call, session)
+                for call in message if not (isinstance(call, dict) and call.get("method") == "auth")
+            ))
+            responses = [response for response in responses if response is not None]
+            return responses or None
+
+        return await self._handle_call(message, session)
+
+    async def _handle_call(self, call: Any, session: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Выполнить один вызов; для уведомлений (без id) ответа нет"""
+        if not isinstance(call, dict) or not isinstance(call.get("method"), str):
+            return self._error(None, INVALID_REQUEST, "Некорректный запрос")
+
+        call_id = call.get("id")
+        params = call.get("params") or {}
+        try:
+            if not isinstance(params, dict):
+                raise RpcError(INVALID_PARAMS, "Параметры передаются объектом")
+            method = call["method"]
+            peer: _Peer = session["peer"]
+            if not (peer.auth if method == "auth" else peer.calls).allow():
+                raise RpcError(RATE_LIMITED, "Превышен лимит запросов")
+
+            if method == "auth":
+                token = str(params.get("token", "")).encode("utf-8")
+                session["authenticated"] = hmac.compare_digest(token, self._token)
+                if not session["authenticated"]:
+                    raise RpcError(UNAUTHORIZED, "Неверный токен")
+                result: Any = True
+            elif not session["authenticated"]:
+                raise RpcError(UNAUTHORIZED, "Требуется auth")
+            elif method not in self._methods:
+                raise RpcError(METHOD_NOT_FOUND, f"Неизвестный метод: {method}")
+            else:
+                result = await self._methods[method](**params)
+        except RpcError as e:
+            return self._error(call_id, e.code, str(e)) if "id" in call else None
+        except TypeError as e:
+            return self._error(call_id, INVALID_PARAMS, str(e)) if "id" in call else None
+        except Exception as e:
+            return self._error(call_id, INTERNAL_ERROR, str(e)) if "id" in call else None
+
+        if "id" not in call:
+            return None
+        return {"jsonrpc": "2.0", "id": call_id, "result": result}
+
+    @staticmethod
+    def _error(call_id: Any, code: int, message: str) -> Dict[str, Any]:
+        return {"jsonrpc": "2.0", "id": call_id, "error": {"code": code, "message": message}}
+
+    @staticmethod
+    def _credential(credential) -> Optional[Dict[str, str]]:
+        """Представить запись объектом ответа"""
+        if credential is None:
+            return None
+        _, login, password, comment = credential
+        return {"login": login, "password": password, "comment": comment}
+
+    async def _ping(self) -> str:
+        return "pong"
+
+    async def _get(self, service: str) -> Optional[Dict[str, str]]:
+        return self._credential(await self._vault.get(service))
+
+    async def _get_many(self, services: List[str]) -> Dict[str, Optional[Dict[str, str]]]:
+        if not isinstance(services, list) or len(services) > APP_CONFIG["RPC_MAX_BATCH"]:
+            raise RpcError(INVALID_PARAMS, f"services - список не длиннее {APP_CONFIG['RPC_MAX_BATCH']}")
+        # Одна задача на весь набор: без переключений между потоками на каждый сервис
+        credentials = await self._vault.get_many(services)
+        return {service: self._credential(credential) for service, credential in credentials.items()}
+
+    async def _list(self, after: Optional[str] = None, limit: int = 100) -> List[List[str]]:
+        limit = min(int(limit), APP_CONFIG["LIST_PAGE_SIZE"])
+        return [list(row) for row in await self._vault.list_page(after, limit)]
+
+    async def _search(self, query: str, limit: Optional[int] = None) -> List[List[str]]:
+        limit = min(int(limit or APP_CONFIG["SEARCH_RESULT_LIMIT"]), APP_CONFIG["SEARCH_RESULT_LIMIT"])
+        return [list(row) async for row in self._vault.search(query, max(limit, 1))]
@@ -3,6 +3,7 @@ Digital Fortress - Менеджер паролей
 Точка входа в приложение
 """
 
+from core.database import db_manager
 from utils.helpers import setup_theme
 from ui.main_window import MainWindow
 from ui.login_window import LoginWindow
@@ -13,6 +14,7 @@ def main():
     import signal
     import sys
     import os
+    import threading
     import tkinter
 
     def signal_handler(sig, frame):
@@ -37,6 +39,8 @@ def main():
         def on_login_success():
             """Callback для успешного входа"""
             nonlocal main_app
+            # Перевести записи старого формата в компактный в фоновом потоке
+            threading.Thread(target=db_manager.warm_up, name="vault-warm-up", daemon=True).start()
             # Создать главное окно
             main_app = MainWindow()
             # Подавляем ошибки для главного окна
@@ -62,6 +66,8 @@ def main():
     except Exception as e:
         print(f"Критическая ошибка приложения: {e}")
     finally:
+        # Закрываем соединения с базой данных
+        db_manager.close()
         # Принудительно завершаем все процессы
         os._exit(0)  # Используем только os._exit
 
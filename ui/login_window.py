@@ -2,12 +2,14 @@
 
 import customtkinter
 import os
+from typing import Callable
 
 from config.settings import APP_CONFIG, KDF_PATH, _
 from config.colors import COLORS
 from core.crypto import crypto_manager
 from core.database import db_manager
 from ui.base import ToastMixin
+from ui.task_runner import Spinner, TaskRunner
 from utils.helpers import center_window, get_system_font, get_mono_font
 
 
@@ -23,8 +25,17 @@ class LoginWindow(customtkinter.CTk, ToastMixin):
         self._active_timers = []  # Добавляем отслеживание таймеров
         self._is_destroying = False  # Флаг для предотвращения повторных вызовов
 
+        # Деривация ключа выполняется в фоновом потоке, результаты
+        # возвращаются в поток Tk через TaskRunner
+        self._runner = TaskRunner(self, workers=1, name="unlock")
+        self._busy = False
+        self._idle_button = None
+
         self._init_window()
         self._setup_ui()
+        self._runner.add_busy_listener(Spinner(
+            self, show=lambda text: self.password_label.configure(text=text)
+        ))
 
         if not KDF_PATH.exists():
             self._setup_mode()
@@ -180,41 +191,55 @@ class LoginWindow(customtkinter.CTk, ToastMixin):
 
     def _check_login(self, event=None):
         """Проверить пароль и войти в систему"""
-        if self._is_destroying:
+        if self._is_destroying or self._busy:
             return
 
         password = self.password_entry.get()
+        self._start_background(
+            "Проверка пароля", crypto_manager.verify_password, password,
+            on_done=self._on_login_checked, cancellable=True,
+            on_discard=self._on_login_discarded
+        )
 
-        try:
-            if crypto_manager.verify_password(password):
-                self.password_label.configure(
-                    text="Вход выполнен успешно",
-                    text_color=COLORS["SUCCESS_COLOR"]
-                )
-                # Уменьшаем задержку до 800ms для быстрого отклика
-                timer_id = self.after(800, self._delayed_success)
-                self._active_timers.append(timer_id)
-            else:
-                self.password_label.configure(
-                    text="Неверный пароль",
-                    text_color=COLORS["ERROR_COLOR"]
-                )
-                self.password_entry.delete(0, "end")
-                # Восстанавливаем текст через 3 секунды
-                timer_id = self.after(3000, lambda: self._restore_label_text(
-                    "Введите мастер-пароль",
-                    COLORS["TEXT_SECONDARY_COLOR"]
-                ))
-                self._active_timers.append(timer_id)
-        except Exception as e:
+    def _on_login_checked(self, unlocked: bool):
+        """Обработать результат проверки пароля (в потоке Tk)"""
+        if unlocked:
+            self.password_label.configure(
+                text="Вход выполнен успешно",
+                text_color=COLORS["SUCCESS_COLOR"]
+            )
+            self._delayed_success()
+        else:
+            # Ключ мог остаться от отмененной ранее проверки
+            crypto_manager.lock()
             self.password_label.configure(
-                text=f"Ошибка: {str(e)[:30]}...",
+                text="Неверный пароль",
                 text_color=COLORS["ERROR_COLOR"]
             )
+            self.password_entry.delete(0, "end")
+            # Восстанавливаем текст через 3 секунды
+            timer_id = self.after(3000, lambda: self._restore_label_text(
+                "Введите мастер-пароль",
+                COLORS["TEXT_SECONDARY_COLOR"]
+            ))
+            self._active_timers.append(timer_id)
+
+    def _on_login_discarded(self, unlocked: bool):
+        """Результат отмененной проверки: не оставляем сессию открытой,
+        если следом не запущена новая проверка"""
+        if unlocked and not self._runner.active("unlock"):
+            crypto_manager.lock()
+
+    def _on_background_error(self, error: Exception):
+        """Показать ошибку фоновой операции"""
+        self.password_label.configure(
+            text=f"Ошибка: {str(error)[:50]}...",
+            text_color=COLORS["ERROR_COLOR"]
+        )
 
     def _create_new_vault(self, event=None):
         """Создать новое хранилище"""
-        if self._is_destroying:
+        if self._is_destroying or self._busy:
             return
 
         password = self.password_entry.get()
@@ -231,35 +256,73 @@ class LoginWindow(customtkinter.CTk, ToastMixin):
             self._active_timers.append(timer_id)
             return
 
-        # Показываем предупреждение через заголовок
-        self.password_label.configure(
-            text="Сохраните мастер-пароль! Если потеряете - доступ невозможен",
-            text_color=COLORS["WARNING_COLOR"]
+        # Создание хранилища не отменяется: файлы ключа и базы пишутся вместе
+        self._start_background(
+            "Создание хранилища", self._create_vault_files, password,
+            on_done=self._on_vault_created, cancellable=False
         )
 
-        try:
-            crypto_manager.create_vault(password)
-            db_manager.setup_database(clear=True)
+    @staticmethod
+    def _create_vault_files(password: str) -> None:
+        """Создать файл ключа и пустую базу (выполняется в фоновом потоке)"""
+        crypto_manager.create_vault(password)
+        db_manager.setup_database(clear=True)
 
-            self.password_label.configure(
-                text="Хранилище создано!",
-                text_color=COLORS["SUCCESS_COLOR"]
-            )
+    def _on_vault_created(self, _):
+        """Обработать создание хранилища (в потоке Tk)"""
+        self.password_label.configure(
+            text="Хранилище создано!",
+            text_color=COLORS["SUCCESS_COLOR"]
+        )
+        self._delayed_success()
+
+    def _start_background(self, busy_text: str, func: Callable, *args,
+                          on_done: Callable, cancellable: bool, on_discard: Callable = None):
+        """Запустить операцию в фоновом потоке и показать индикатор"""
+        self._set_busy(True, busy_text, cancellable)
+        self._runner.submit(
+            func, *args, key="unlock", busy_text=busy_text,
+            on_done=lambda result: self._finish_background(on_done, result),
+            on_error=lambda error: self._finish_background(self._on_background_error, error),
+            on_discard=on_discard
+        )
 
-            if crypto_manager.verify_password(password):
-                # Уменьшаем задержку до 1 секунды для создания хранилища
-                timer_id = self.after(1000, self._delayed_success)
-                self._active_timers.append(timer_id)
+    def _finish_background(self, handler: Callable, value):
+        """Снять режим ожидания и передать результат обработчику"""
+        self._set_busy(False)
+        handler(value)
+
+    def _set_busy(self, busy: bool, text: str = "", cancellable: bool = False):
+        """Переключить окно в режим ожидания фоновой операции"""
+        self._busy = busy
+
+        if busy:
+            self.password_label.configure(text=f"{text}...", text_color=COLORS["TEXT_SECONDARY_COLOR"])
+            self.password_entry.configure(state="disabled")
+            if cancellable:
+                self._idle_button = (self.login_button.cget("text"), self.login_button.cget("command"))
+                self.login_button.configure(text="Отмена", command=self._cancel_background)
+                self.bind("<Escape>", self._cancel_background)
             else:
-                self.password_label.configure(
-                    text="Ошибка при создании хранилища",
-                    text_color=COLORS["ERROR_COLOR"]
-                )
-        except Exception as e:
-            self.password_label.configure(
-                text=f"Ошибка: {str(e)[:50]}...",
-                text_color=COLORS["ERROR_COLOR"]
-            )
+                self.login_button.configure(state="disabled")
+        else:
+            self.password_entry.configure(state="normal")
+            self.login_button.configure(state="normal")
+            if self._idle_button:
+                self.login_button.configure(text=self._idle_button[0], command=self._idle_button[1])
+                self._idle_button = None
+            self.unbind("<Escape>")
+
+    def _cancel_background(self, event=None):
+        """Отменить ожидание фоновой проверки пароля"""
+        if not self._busy or self.login_button.cget("text") != "Отмена":
+            return
+
+        # Деривацию ключа нельзя прервать, поэтому ее результат просто игнорируется
+        self._runner.cancel("unlock")
+        self._set_busy(False)
+        self._restore_label_text("Введите мастер-пароль", COLORS["TEXT_SECONDARY_COLOR"])
+        self.password_entry.focus()
 
     def _restore_label_text(self, text: str, color: str):
         """Восстановить текст метки (с проверкой на уничтожение)"""
@@ -305,6 +368,7 @@ class LoginWindow(customtkinter.CTk, ToastMixin):
 
         self._is_destroying = True
         self._cancel_all_timers()
+        self._runner.close()
         self.cleanup_notifications()
 
         if self._overlay_frame:
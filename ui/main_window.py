@@ -3,13 +3,17 @@
 import customtkinter
 import tkinter as tk
 import os
+import queue
 from typing import Optional, Dict, Any
 
 from config.settings import APP_CONFIG, _
 from config.colors import COLORS
-from core.database import db_manager
+from core.database import Change, db_manager
 from ui.base import ToastMixin
-from utils.helpers import center_window, truncate_text, generate_password, get_system_font, get_mono_font
+from ui.search_controller import SearchController
+from ui.task_runner import Spinner, TaskRunner
+from ui.virtual_list import VirtualList
+from utils.helpers import center_window, generate_password, get_system_font, get_mono_font
 
 
 class MainWindow(customtkinter.CTk, ToastMixin):
@@ -19,10 +23,14 @@ class MainWindow(customtkinter.CTk, ToastMixin):
         super().__init__()
         ToastMixin.__init__(self)
 
-        self._selected_service_idx: Optional[int] = None
         self._editing_credential_id: Optional[int] = None
         self._form_widgets: Dict[str, Any] = {}
-        self._service_cards: list = []
+        # Изменения записей от db_manager, применяются к списку точечно
+        self._changes: "queue.SimpleQueue[Change]" = queue.SimpleQueue()
+        self._shown_query: Optional[str] = None
+        db_manager.add_change_listener(self._changes.put)
+        # Работа с базой и шифрованием выполняется вне потока Tk
+        self._runner = TaskRunner(self)
 
         self._init_window()
         self._setup_ui()
@@ -94,6 +102,17 @@ class MainWindow(customtkinter.CTk, ToastMixin):
         )
         title_label.pack(side="left")
 
+        # Индикатор фоновых операций
+        self.busy_label = customtkinter.CTkLabel(
+            header_frame, text="", font=customtkinter.CTkFont(size=13, family=get_system_font()),
+            text_color=COLORS["TEXT_SECONDARY_COLOR"]
+        )
+        self.busy_label.pack(side="right")
+        self._runner.add_busy_listener(Spinner(
+            self, show=lambda text: self.busy_label.configure(text=text),
+            on_idle=lambda: self.busy_label.configure(text="")
+        ))
+
         # Поле поиска
         self.search_entry = customtkinter.CTkEntry(
             frame, placeholder_text="Поиск", height=40,
@@ -103,141 +122,80 @@ class MainWindow(customtkinter.CTk, ToastMixin):
             placeholder_text_color=COLORS["TEXT_SECONDARY_COLOR"]
         )
         self.search_entry.grid(row=1, column=0, padx=20, pady=(0, 14), sticky="ew")
-        self.search_entry.bind("<KeyRelease>", self.filter_listbox)
+        self._search = SearchController(
+            self.search_entry, self._runner, search=db_manager.fuzzy_search,
+            on_results=self._show_search_results,
+            on_clear=self.populate_listbox,
+            on_error=lambda e: self.show_toast(f"Ошибка поиска: {str(e)}", COLORS["ERROR_COLOR"]),
+            # Нечеткий поиск не монотонен: короткие слова ищутся по началам
+            # слов, длинные - по триграммам и опечаткам, поэтому не сужаем
+            narrowing=False
+        )
+        self.search_entry.bind("<KeyRelease>", self._search.on_input)
 
-        # Скроллируемый список записей
-        self.records_frame = customtkinter.CTkScrollableFrame(
-            frame, fg_color=COLORS["PANEL_COLOR"], corner_radius=12, border_width=0
+        # Виртуализированный список записей: виджеты только для видимых строк
+        self.records_list = VirtualList(
+            frame, on_select=self.start_edit_mode,
+            fg_color=COLORS["PANEL_COLOR"], corner_radius=12, border_width=0
         )
-        self.records_frame.grid(row=2, column=0, padx=0, pady=(0, 24), sticky="nsew")
-        self.records_frame.grid_columnconfigure(0, weight=1)
-        self.records_frame._scrollbar.grid_remove()
+        self.records_list.grid(row=2, column=0, padx=0, pady=(0, 24), sticky="nsew")
 
     def populate_listbox(self):
         """Заполнить список сохраненных паролей"""
-        # Очищаем существующие виджеты
-        for widget in self.records_frame.winfo_children():
-            widget.destroy()
-
-        try:
-            services = db_manager.get_all_credentials()
-            self.records_frame._scrollbar.grid_remove()
-            self.after_idle(lambda: self._show_scrollbar_if_needed())
-
-            if not services:
-                # Показать сообщение о пустом списке
-                empty_label = customtkinter.CTkLabel(
-                    self.records_frame, text="Нет сохранённых записей",
-                    font=customtkinter.CTkFont(size=15, family=get_system_font()),
-                    text_color=COLORS["TEXT_SECONDARY_COLOR"]
-                )
-                empty_label.grid(row=0, column=0, sticky="ew", padx=12, pady=8)
-            else:
-                # Создать карточки для каждого сервиса
-                max_service_len = 28
-                for idx, (service, login) in enumerate(services):
-                    self._create_service_card(idx, service, login, max_service_len)
-
-        except Exception as e:
+        self._shown_query = None
+        # Ключ общий с поиском: в список попадает только последний результат
+        self._runner.submit(
+            db_manager.get_all_credentials, key=SearchController.TASK_KEY, busy_text="Загрузка",
+            on_done=lambda services: self.records_list.set_items(services, empty_text="Нет сохранённых записей"),
             # Показать ошибку загрузки
-            error_label = customtkinter.CTkLabel(
-                self.records_frame, text="Ошибка загрузки данных",
-                font=customtkinter.CTkFont(size=15, family=get_system_font()),
-                text_color=COLORS["ERROR_COLOR"]
-            )
-            error_label.grid(row=0, column=0, sticky="ew", padx=12, pady=8)
-
-    def _create_service_card(self, idx: int, service: str, login: str, max_service_len: int):
-        """Создать карточку сервиса в списке"""
-        card = customtkinter.CTkFrame(
-            self.records_frame, fg_color=COLORS["PANEL_ALT_COLOR"],
-            corner_radius=10, border_width=0
-        )
-        card.grid(row=idx, column=0, sticky="ew", padx=12, pady=6)
-
-        service_label = customtkinter.CTkLabel(
-            card, text=truncate_text(service, max_service_len),
-            font=customtkinter.CTkFont(size=15, weight="normal", family=get_system_font()),
-            text_color=COLORS["ACCENT_COLOR"]
+            on_error=lambda e: self.records_list.show_message("Ошибка загрузки данных", COLORS["ERROR_COLOR"])
         )
-        service_label.grid(row=0, column=0, sticky="w", padx=(12, 4), pady=8)
 
-        login_label = customtkinter.CTkLabel(
-            card, text=truncate_text(login, 18),
-            font=customtkinter.CTkFont(size=13, family=get_system_font()),
-            text_color=COLORS["TEXT_SECONDARY_COLOR"]
-        )
-        login_label.grid(row=0, column=1, sticky="w", padx=(0, 4), pady=8)
-
-        # Добавить эффекты наведения
-        def on_enter(e, c=card):
-            c.configure(fg_color=COLORS["PANEL_LIGHT_COLOR"])
-        def on_leave(e, c=card):
-            c.configure(fg_color=COLORS["PANEL_ALT_COLOR"])
-
-        for widget in [card, service_label, login_label]:
-            widget.bind("<Enter>", on_enter)
-            widget.bind("<Leave>", on_leave)
-            widget.bind("<Button-1>", lambda event, s=service: self.start_edit_mode(s))
-
-    def _show_scrollbar_if_needed(self):
-        """Показать полосу прокрутки если нужно"""
-        frame_height = self.records_frame.winfo_height()
-        content_height = sum(child.winfo_height() for child in self.records_frame.winfo_children())
-        if content_height > frame_height:
-            self.records_frame._scrollbar.grid()
-        else:
-            self.records_frame._scrollbar.grid_remove()
+    def _show_search_results(self, services):
+        """Показать результат поиска; при повторе того же запроса прокрутка сохраняется"""
+        query = self._search.query
+        self.records_list.set_items(services, empty_text="Ничего не найдено",
+                                    keep_scroll=query == self._shown_query)
+        self._shown_query = query
 
     def filter_listbox(self, event=None):
-        """Фильтровать список по поисковому запросу с исправленной логикой"""
-        search_text = self.search_entry.get().strip().lower()
-
-        # Очистить существующие карточки
-        self._clear_service_cards()
-
-        if not search_text:
-            # Показать все записи
-            self.populate_listbox()
+        """Применить поисковый запрос сразу, без задержки ввода"""
+        self._search.refresh()
+
+    def _apply_changes(self):
+        """Применить к списку накопившиеся изменения записей
+
+        Без поискового запроса список меняется точечно: одна вставка, замена
+        или удаление на изменение. Результат поиска зависит от ранжирования,
+        поэтому запрос выполняется заново с сохранением прокрутки.
+        """
+        changes = []
+        while True:
+            try:
+                changes.append(self._changes.get_nowait())
+            except queue.Empty:
+                break
+        if not changes:
+            return
+        if self._shown_query is not None or self._runner.active(SearchController.TASK_KEY):
+            # Загружаемый список мог быть прочитан до изменения
+            self.filter_listbox()
             return
 
-        try:
-            # Получить отфильтрованные данные из БД
-            services = db_manager.get_all_credentials()
-            filtered_services = [
-                (service, login) for service, login in services
-                if search_text in service.lower() or search_text in login.lower()
-            ]
-
-            self._display_filtered_services(filtered_services)
-
-        except Exception as e:
-            self.show_toast(f"Ошибка поиска: {str(e)}", COLORS["ERROR_COLOR"])
-
-    def _clear_service_cards(self):
-        """Очистить карточки сервисов"""
-        for widget in self.records_frame.winfo_children():
-            widget.destroy()
-        self._service_cards.clear()
-
-    def _display_filtered_services(self, services):
-        """Отобразить отфильтрованные сервисы"""
-        if not services:
-            empty_label = customtkinter.CTkLabel(
-                self.records_frame, text="Ничего не найдено",
-                font=customtkinter.CTkFont(size=15, family=get_system_font()),
-                text_color=COLORS["TEXT_SECONDARY_COLOR"]
-            )
-            empty_label.grid(row=0, column=0, sticky="ew", padx=12, pady=8)
-        else:
-            max_service_len = 28
-            for idx, (service, login) in enumerate(services):
-                self._create_service_card(idx, service, login, max_service_len)
+        self._search.invalidate()
+        for change in changes:
+            if change.kind == "deleted":
+                self.records_list.remove_item(change.previous)
+            elif change.kind == "updated" and change.previous:
+                self.records_list.replace_item(change.previous, change.item)
+            else:
+                self.records_list.insert_item(change.item)
 
     def _reset_form(self):
         """Сбросить форму (замена cancel_edit_mode)"""
         self._editing_credential_id = None
-        self._selected_service_idx = None
+        self._runner.cancel("edit")
+        self.records_list.select(None)
         self._clear_form_data()
         self._set_form_mode(editing=False)
         if 'service' in self._form_widgets:
@@ -257,28 +215,35 @@ class MainWindow(customtkinter.CTk, ToastMixin):
 
     def start_edit_mode(self, service_name: str):
         """Начать редактирование записи"""
-        try:
-            credential = db_manager.get_credential(service_name)
-            if credential:
-                self._editing_credential_id, login, password, comment = credential
-
-                form_data = {
-                    'service': service_name,
-                    'login': login,
-                    'password': password,
-                    'comment': comment or ''
-                }
-
-                self._set_form_data(form_data)
-                self._set_form_mode(editing=True)
-                if 'service' in self._form_widgets:
-                    self._form_widgets['service'].focus_set()
+        # Выбор другой записи до окончания загрузки отменяет предыдущую
+        self.records_list.select(service_name)
+        self._runner.submit(
+            db_manager.get_credential, service_name, key="edit", busy_text="Загрузка записи",
+            on_done=lambda credential: self._show_credential(service_name, credential),
+            on_error=lambda e: self.show_toast(f"Ошибка загрузки записи: {str(e)}", COLORS["ERROR_COLOR"])
+        )
 
-        except Exception as e:
-            self.show_toast(f"Ошибка загрузки записи: {str(e)}", COLORS["ERROR_COLOR"])
+    def _show_credential(self, service_name: str, credential):
+        """Заполнить форму загруженной записью"""
+        if credential:
+            self._editing_credential_id, login, password, comment = credential
+
+            form_data = {
+                'service': service_name,
+                'login': login,
+                'password': password,
+                'comment': comment or ''
+            }
+
+            self._set_form_data(form_data)
+            self._set_form_mode(editing=True)
+            if 'service' in self._form_widgets:
+                self._form_widgets['service'].focus_set()
 
     def _save_credentials(self):
         """Сохранить учетные данные (приватный метод)"""
+        if self._runner.active("write"):
+            return
         form_data = self._get_form_data()
 
         # Валидация
@@ -287,33 +252,40 @@ class MainWindow(customtkinter.CTk, ToastMixin):
             self.show_toast(error_msg, COLORS["WARNING_COLOR"])
             return
 
-        try:
-            if self._editing_credential_id:
-                # Обновление существующей записи
-                db_manager.save_credential(
-                    form_data['service'], form_data['login'],
-                    form_data['password'], form_data['comment'],
-                    self._editing_credential_id
-                )
-                self.populate_listbox()
-                self.start_edit_mode(form_data['service'])
-                self.show_toast("Запись обновлена", COLORS["SUCCESS_COLOR"])
-            else:
-                # Создание новой записи
-                if db_manager.service_exists(form_data['service']):
-                    self.show_toast("Сервис уже существует", COLORS["WARNING_COLOR"])
-                    return
-
-                db_manager.save_credential(
-                    form_data['service'], form_data['login'],
-                    form_data['password'], form_data['comment']
-                )
-                self.populate_listbox()
-                self._reset_form()
-                self.show_toast("Запись добавлена", COLORS["SUCCESS_COLOR"])
+        credential_id = self._editing_credential_id
+        self._runner.submit(
+            self._store_credentials, form_data, credential_id, key="write", busy_text="Сохранение",
+            on_done=lambda stored: self._on_credentials_saved(stored, form_data, credential_id),
+            on_error=lambda e: self.show_toast(f"Ошибка сохранения: {str(e)}", COLORS["ERROR_COLOR"])
+        )
 
-        except Exception as e:
-            self.show_toast(f"Ошибка сохранения: {str(e)}", COLORS["ERROR_COLOR"])
+    @staticmethod
+    def _store_credentials(form_data: Dict[str, str], credential_id: Optional[int]) -> bool:
+        """Записать форму в базу (в фоновом потоке); False - сервис уже существует"""
+        if not credential_id and db_manager.service_exists(form_data['service']):
+            return False
+        db_manager.save_credential(
+            form_data['service'], form_data['login'],
+            form_data['password'], form_data['comment'],
+            credential_id
+        )
+        return True
+
+    def _on_credentials_saved(self, stored: bool, form_data: Dict[str, str], credential_id: Optional[int]):
+        """Обновить список и форму после сохранения"""
+        if not stored:
+            self.show_toast("Сервис уже существует", COLORS["WARNING_COLOR"])
+            return
+
+        self._apply_changes()
+        if credential_id:
+            # Обновление существующей записи
+            self.start_edit_mode(form_data['service'])
+            self.show_toast("Запись обновлена", COLORS["SUCCESS_COLOR"])
+        else:
+            # Создание новой записи
+            self._reset_form()
+            self.show_toast("Запись добавлена", COLORS["SUCCESS_COLOR"])
 
     def _toggle_password_visibility(self, entry_widget):
         """Переключить видимость пароля"""
@@ -616,13 +588,19 @@ class MainWindow(customtkinter.CTk, ToastMixin):
 
     def _delete_credential_confirmed(self):
         """Подтвердить удаление записи"""
-        try:
-            db_manager.delete_credential(self._editing_credential_id)
-            self.populate_listbox()
-            self.cancel_edit_mode()
-            self.show_toast("Удалено", COLORS["SUCCESS_COLOR"])
-        except Exception as e:
-            self.show_toast(str(e), COLORS["ERROR_COLOR"])
+        if self._editing_credential_id is None or self._runner.active("write"):
+            return
+        self._runner.submit(
+            db_manager.delete_credential, self._editing_credential_id, key="write", busy_text="Удаление",
+            on_done=lambda _: self._on_credential_deleted(),
+            on_error=lambda e: self.show_toast(str(e), COLORS["ERROR_COLOR"])
+        )
+
+    def _on_credential_deleted(self):
+        """Обновить список и форму после удаления"""
+        self._apply_changes()
+        self.cancel_edit_mode()
+        self.show_toast("Удалено", COLORS["SUCCESS_COLOR"])
 
     def _cancel_all_tkinter_timers(self):
         """Отменить все внутренние таймеры tkinter"""
@@ -637,12 +615,16 @@ class MainWindow(customtkinter.CTk, ToastMixin):
         """Обработчик закрытия окна"""
         try:
             self.cleanup_notifications()
+            self._search.close()
+            self._runner.close()
+            db_manager.remove_change_listener(self._changes.put)
             self.quit()  # Выходим из mainloop
             self.withdraw()  # Скрываем окно
         except Exception:
             pass
         finally:
-            # Принудительно завершаем процесс
+            # Закрываем соединения с базой данных и завершаем процесс
+            db_manager.close()
             import os
             os._exit(0)
 
@@ -0,0 +1,121 @@
+"""Контроллер строки поиска: задержка ввода, отмена устаревших запросов, сужение результатов"""
+
+from typing import Callable, List, Optional, Tuple
+
+from config.settings import APP_CONFIG
+from ui.task_runner import TaskRunner
+
+Item = Tuple[str, str]
+
+
+def matches(query: str, service: str, login: str) -> bool:
+    """Проверить, что все слова запроса входят в сервис или логин без учета регистра"""
+    service, login = service.casefold(), login.casefold()
+    return all(term in service or term in login for term in query.casefold().split())
+
+
+class SearchController:
+    """Запускает поиск после паузы в наборе и применяет только последний результат
+
+    - нажатия, не меняющие текст (стрелки, Shift), игнорируются;
+    - запрос выполняется через SEARCH_DEBOUNCE_MS после последнего изменения;
+    - если новый запрос продолжает предыдущий, а предыдущий результат полный,
+      результат сужается в памяти без обращения к базе (narrowing=False
+      отключает сужение для поиска, где результат продолжения не обязательно
+      входит в предыдущий, например нечеткого);
+    - запрос к базе выполняется через TaskRunner, а результат устаревшего
+      запроса отбрасывается.
+    """
+
+    # Общий ключ с загрузкой полного списка: в список попадает только последний результат
+    TASK_KEY = "list"
+
+    def __init__(self, widget, runner: TaskRunner, search: Callable[[str], List[Item]],
+                 on_results: Callable[[List[Item]], None], on_clear: Callable[[], None],
+                 on_error: Optional[Callable[[Exception], None]] = None,
+                 narrow: Optional[Callable[[str, List[Item]], List[Item]]] = None,
+                 narrowing: bool = True):
+        self._widget = widget
+        self._runner = runner
+        self._search = search
+        # Сужение должно совпадать с логикой search; по умолчанию - по подстрокам
+        self._narrow = narrow or (lambda query, items: [item for item in items if matches(query, *item)])
+        self._narrowing = narrowing
+        self._on_results = on_results
+        self._on_clear = on_clear
+        self._on_error = on_error
+        self._timer: Optional[str] = None
+        self._pending_text: Optional[str] = None
+        # Последний примененный результат для сужения
+        self._last_query: Optional[str] = None
+        self._last_results: List[Item] = []
+
+    @property
+    def query(self) -> str:
+        """Текущий текст запроса"""
+        return self._widget.get().strip()
+
+    def on_input(self, event=None) -> None:
+        """Обработчик ввода: перезапустить таймер, если текст изменился"""
+        text = self.query
+        if text == self._pending_text:
+            return
+        self._pending_text = text
+        self._runner.cancel(self.TASK_KEY)
+        self._cancel_timer()
+        self._timer = self._widget.after(APP_CONFIG["SEARCH_DEBOUNCE_MS"], self._run)
+
+    def refresh(self) -> None:
+        """Немедленно выполнить текущий запрос заново (данные изменились)"""
+        self.invalidate()
+        self._pending_text = self.query
+        self._cancel_timer()
+        self._run()
+
+    def invalidate(self) -> None:
+        """Забыть результат для сужения после изменения данных"""
+        self._last_query = None
+        self._last_results = []
+
+    def close(self) -> None:
+        """Отменить таймер и незавершенный запрос"""
+        self._cancel_timer()
+        self._runner.cancel(self.TASK_KEY)
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._widget.after_cancel(self._timer)
+            self._timer = None
+
+    def _run(self) -> None:
+        """Выполнить запрос: пустой - показать все, продолжение - сузить, иначе - база"""
+        self._timer = None
+        query = self._pending_text or ""
+        self._runner.cancel(self.TASK_KEY)
+
+        if not query:
+            self.invalidate()
+            self._on_clear()
+            return
+
+        if self._can_narrow(query):
+            results = self._narrow(query, self._last_results)
+            self._apply(query, results)
+            return
+
+        self._runner.submit(
+            self._search, query, key=self.TASK_KEY,
+            on_done=lambda results: self._apply(query, results), on_error=self._on_error
+        )
+
+    def _can_narrow(self, query: str) -> bool:
+        """Можно ли получить результат фильтрацией предыдущего"""
+        last = self._last_query
+        return (self._narrowing and last is not None and query.lower().startswith(last.lower())
+                and len(self._last_results) < APP_CONFIG["SEARCH_RESULT_LIMIT"])
+
+    def _apply(self, query: str, results: List[Item]) -> None:
+        """Запомнить и отобразить результат"""
+        self._last_query = query
+        self._last_results = results
+        self._on_results(results)
@@ -0,0 +1,259 @@
+"""Фоновое выполнение операций интерфейса с возвратом результата в поток Tk"""
+
+import itertools
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config.settings import APP_CONFIG
+
+
+class TaskCancelled(Exception):
+    """Задача отменена через CancelToken"""
+
+
+class CancelToken:
+    """Флаг отмены задачи
+
+    Отмененная задача, которая еще не началась, не запускается, а результат
+    уже выполняющейся отбрасывается. Долгая функция может проверять флаг
+    между шагами (передайте with_token=True в TaskRunner.submit).
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        """Отменить задачу"""
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        """Отменена ли задача"""
+        return self._event.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        """Прервать выполнение, если задача отменена"""
+        if self._event.is_set():
+            raise TaskCancelled()
+
+
+class _Task:
+    """Запущенная задача и ее обработчики"""
+
+    __slots__ = ("task_id", "key", "token", "future", "busy_text", "on_done", "on_error", "on_discard")
+
+    def __init__(self, task_id: int, key: Optional[str], busy_text: Optional[str],
+                 on_done, on_error, on_discard):
+        self.task_id = task_id
+        self.key = key
+        self.token = CancelToken()
+        self.future: Optional[Future] = None
+        self.busy_text = busy_text
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_discard = on_discard
+
+
+class TaskRunner:
+    """Пул потоков для работы с базой и шифрованием из обработчиков Tk
+
+    - функции выполняются в TASK_WORKERS фоновых потоках, а обработчики
+      результата вызываются в потоке Tk: готовые задачи забираются из очереди
+      таймером after, пока есть незавершенные задачи;
+    - у задач с одинаковым ключом выигрывает последняя: предыдущая
+      отменяется, и ее результат не доходит до обработчика;
+    - задачи с текстом busy_text включают индикатор занятости: подписчики
+      add_busy_listener получают текст последней активной задачи или None.
+    """
+
+    def __init__(self, widget, workers: Optional[int] = None, name: str = "ui-task"):
+        self._widget = widget
+        self._executor = ThreadPoolExecutor(max_workers=workers or APP_CONFIG["TASK_WORKERS"],
+                                            thread_name_prefix=name)
+        self._done: "queue.SimpleQueue[_Task]" = queue.SimpleQueue()
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, _Task] = {}
+        self._latest: Dict[str, _Task] = {}
+        self._busy_listeners: List[Callable[[Optional[str]], None]] = []
+        self._busy_text: Optional[str] = None
+        self._poll_timer: Optional[str] = None
+        self._closed = False
+
+    def submit(self, func: Callable[..., Any], *args, key: Optional[str] = None,
+               busy_text: Optional[str] = None,
+               on_done: Optional[Callable[[Any], None]] = None,
+               on_error: Optional[Callable[[Exception], None]] = None,
+               on_discard: Optional[Callable[[Any], None]] = None,
+               with_token: bool = False, **kwargs) -> CancelToken:
+        """Запустить func(*args, **kwargs) в фоновом потоке
+
+        on_done получает результат, on_error - исключение; оба вызываются в
+        потоке Tk. on_discard получает результат успешно завершившейся, но
+        отмененной или вытесненной задачи (например, чтобы закрыть открытую
+        ею сессию). При with_token функция получает аргумент token.
+        """
+        if self._closed:
+            raise RuntimeError("TaskRunner остановлен")
+        task = _Task(next(self._ids), key, busy_text, on_done, on_error, on_discard)
+        # Новая задача учитывается до отмены предыдущей: индикатор не мигает
+        self._pending[task.task_id] = task
+        if key is not None:
+            previous = self._latest.get(key)
+            if previous is not None:
+                self._cancel_task(previous)
+            self._latest[key] = task
+        if with_token:
+            kwargs["token"] = task.token
+
+        task.future = self._executor.submit(self._call, task.token, func, args, kwargs)
+        task.future.add_done_callback(lambda _: self._done.put(task))
+        self._update_busy()
+        if self._poll_timer is None:
+            self._poll_timer = self._widget.after(APP_CONFIG["TASK_POLL_MS"], self._poll)
+        return task.token
+
+    @staticmethod
+    def _call(token: CancelToken, func: Callable[..., Any], args: Tuple, kwargs: Dict[str, Any]) -> Any:
+        """Выполнить функцию, если задачу не отменили до запуска"""
+        token.raise_if_cancelled()
+        return func(*args, **kwargs)
+
+    def cancel(self, key: str) -> None:
+        """Отменить последнюю задачу с ключом"""
+        task = self._latest.get(key)
+        if task is not None:
+            self._cancel_task(task)
+
+    def active(self, key: str) -> bool:
+        """Выполняется ли неотмененная задача с ключом"""
+        task = self._latest.get(key)
+        return task is not None and not task.token.cancelled
+
+    def _cancel_task(self, task: _Task) -> None:
+        """Отменить задачу и убрать ее из индикатора"""
+        task.token.cancel()
+        if task.future is not None:
+            task.future.cancel()
+        if self._latest.get(task.key) is task:
+            del self._latest[task.key]
+        self._update_busy()
+
+    @property
+    def busy_text(self) -> Optional[str]:
+        """Текст индикатора занятости или None"""
+        return self._busy_text
+
+    def add_busy_listener(self, callback: Callable[[Optional[str]], None]) -> None:
+        """Подписаться на изменения индикатора занятости"""
+        self._busy_listeners.append(callback)
+
+    def _update_busy(self) -> None:
+        """Пересчитать индикатор по активным задачам и уведомить подписчиков"""
+        texts = [task.busy_text for task in self._pending.values()
+                 if task.busy_text and not task.token.cancelled]
+        text = texts[-1] if texts else None
+        if text != self._busy_text:
+            self._busy_text = text
+            for callback in list(self._busy_listeners):
+                callback(text)
+
+    def _poll(self) -> None:
+        """Передать готовые результаты обработчикам (в потоке Tk)"""
+        self._poll_timer = None
+        if self._closed:
+            return
+        try:
+            while True:
+                try:
+                    task = self._done.get_nowait()
+                except queue.Empty:
+                    break
+                self._pending.pop(task.task_id, None)
+                if self._latest.get(task.key) is task:
+                    del self._latest[task.key]
+                self._deliver(task)
+        finally:
+            # Ошибка в обработчике не должна останавливать опрос остальных задач
+            self._update_busy()
+            if self._pending and self._poll_timer is None and not self._closed:
+                self._poll_timer = self._widget.after(APP_CONFIG["TASK_POLL_MS"], self._poll)
+
+    def _deliver(self, task: _Task) -> None:
+        """Вызвать обработчик результата, если задача не отменена"""
+        future = task.future
+        if future.cancelled():
+            return
+        error = future.exception()
+        if task.token.cancelled:
+            if error is None and task.on_discard:
+                task.on_discard(future.result())
+            return
+        if error is None:
+            if task.on_done:
+                task.on_done(future.result())
+        elif isinstance(error, TaskCancelled):
+            return
+        elif task.on_error:
+            task.on_error(error)
+
+    def close(self) -> None:
+        """Отменить задачи и остановить пул, не дожидаясь выполняющихся"""
+        self._closed = True
+        for task in list(self._pending.values()):
+            task.token.cancel()
+            task.future.cancel()
+        if self._poll_timer is not None:
+            try:
+                self._widget.after_cancel(self._poll_timer)
+            except Exception:
+                pass
+            self._poll_timer = None
+        self._executor.shutdown(wait=False)
+
+
+class Spinner:
+    """Анимированный индикатор занятости для подписки на TaskRunner
+
+    Пока есть текст, каждые interval мс вызывает show с кадром анимации и
+    текстом; при None останавливается и вызывает on_idle.
+    """
+
+    FRAMES = "◐◓◑◒"
+
+    def __init__(self, widget, show: Callable[[str], None],
+                 on_idle: Optional[Callable[[], None]] = None, interval: int = 80):
+        self._widget = widget
+        self._show = show
+        self._on_idle = on_idle
+        self._interval = interval
+        self._text: Optional[str] = None
+        self._step = 0
+        self._timer: Optional[str] = None
+
+    def __call__(self, text: Optional[str]) -> None:
+        self._text = text
+        if text is None:
+            self.stop()
+            if self._on_idle:
+                self._on_idle()
+        elif self._timer is None:
+            self._tick()
+
+    def _tick(self) -> None:
+        self._timer = None
+        if self._text is None:
+            return
+        self._step = (self._step + 1) % len(self.FRAMES)
+        self._show(f"{self.FRAMES[self._step]} {self._text}...")
+        self._timer = self._widget.after(self._interval, self._tick)
+
+    def stop(self) -> None:
+        """Остановить анимацию"""
+        if self._timer is not None:
+            try:
+                self._widget.after_cancel(self._timer)
+            except Exception:
+                pass
+            self._timer = None
@@ -0,0 +1,301 @@
+"""Виртуализированный список карточек сервисов"""
+
+import math
+import sys
+import tkinter as tk
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import customtkinter
+
+from config.colors import COLORS
+from config.settings import APP_CONFIG
+from core.metadata_index import sort_key
+from utils.helpers import truncate_text, get_system_font
+
+Item = Tuple[str, str]
+
+
+class _Card:
+    """Карточка из пула: виджеты создаются один раз и получают новые данные при прокрутке"""
+
+    def __init__(self, owner: "VirtualList", fonts: Tuple[customtkinter.CTkFont, customtkinter.CTkFont]):
+        self.index: Optional[int] = None
+        self.item: Optional[Item] = None
+        self.selected = False
+        self._owner = owner
+
+        self.frame = customtkinter.CTkFrame(
+            owner.body, fg_color=COLORS["PANEL_ALT_COLOR"],
+            corner_radius=10, border_width=0, height=owner.row_height - 12
+        )
+        self.frame.grid_propagate(False)
+        self.frame.grid_rowconfigure(0, weight=1)
+
+        self.service_label = customtkinter.CTkLabel(
+            self.frame, text="", font=fonts[0], text_color=COLORS["ACCENT_COLOR"]
+        )
+        self.service_label.grid(row=0, column=0, sticky="w", padx=(12, 4))
+
+        self.login_label = customtkinter.CTkLabel(
+            self.frame, text="", font=fonts[1], text_color=COLORS["TEXT_SECONDARY_COLOR"]
+        )
+        self.login_label.grid(row=0, column=1, sticky="w", padx=(0, 4))
+
+        for widget in (self.frame, self.service_label, self.login_label):
+            widget.bind("<Enter>", lambda e: self.frame.configure(fg_color=COLORS["PANEL_LIGHT_COLOR"]))
+            widget.bind("<Leave>", lambda e: self.frame.configure(fg_color=COLORS["PANEL_ALT_COLOR"]))
+            widget.bind("<Button-1>", lambda e: self._owner.on_card_click(self))
+            owner.bind_scroll(widget)
+
+    def show(self, index: int, item: Item, y: int) -> None:
+        """Показать элемент списка в позиции y"""
+        if self.item != item:
+            service, login = item
+            self.service_label.configure(text=truncate_text(service, 28))
+            self.login_label.configure(text=truncate_text(login, 18))
+            self.item = item
+        self.set_selected(item[0] == self._owner.selected)
+        self.index = index
+        self.frame.place(x=0, y=y, relwidth=1.0)
+
+    def set_selected(self, selected: bool) -> None:
+        """Выделить карточку рамкой"""
+        if selected != self.selected:
+            self.frame.configure(border_width=2 if selected else 0, border_color=COLORS["ACCENT_COLOR"])
+            self.selected = selected
+
+    def hide(self) -> None:
+        """Убрать карточку из видимой области"""
+        if self.index is not None:
+            self.frame.place_forget()
+            self.index = None
+
+
+class VirtualList(customtkinter.CTkFrame):
+    """Список, создающий виджеты только для видимых строк
+
+    Держит пул карточек на высоту окна плюс LIST_OVERSCAN строк и при
+    прокрутке переназначает им данные, поэтому число виджетов и время
+    отрисовки не зависят от размера хранилища. Отдельные записи можно
+    вставлять, заменять и удалять без перезагрузки списка: прокрутка и
+    выделение при этом сохраняются.
+    """
+
+    def __init__(self, master, on_select: Callable[[str], None], **kwargs):
+        super().__init__(master, **kwargs)
+        self.row_height: int = APP_CONFIG["LIST_ROW_HEIGHT"]
+        self._overscan: int = APP_CONFIG["LIST_OVERSCAN"]
+        self._on_select = on_select
+        self._items: List[Item] = []
+        self._empty_text = ""
+        self._selected: Optional[str] = None
+        self._offset = 0
+        self._pool: List[_Card] = []
+        self._render_pending = False
+        # Шрифты общие для всех карточек
+        self._fonts = (
+            customtkinter.CTkFont(size=15, weight="normal", family=get_system_font()),
+            customtkinter.CTkFont(size=13, family=get_system_font()),
+        )
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+
+        self.body = tk.Frame(self, bg=COLORS["PANEL_COLOR"], highlightthickness=0, borderwidth=0)
+        self.body.grid(row=0, column=0, sticky="nsew", padx=12, pady=6)
+        self.body.bind("<Configure>", lambda e: self._schedule_render())
+        self.bind_scroll(self.body)
+
+        self._scrollbar = customtkinter.CTkScrollbar(self, command=self._on_scrollbar)
+        self._scrollbar.grid(row=0, column=1, sticky="ns")
+        self._scrollbar.grid_remove()
+
+        self._message = customtkinter.CTkLabel(
+            self.body, text="", font=customtkinter.CTkFont(size=15, family=get_system_font()),
+            text_color=COLORS["TEXT_SECONDARY_COLOR"]
+        )
+
+    # Данные
+
+    def set_items(self, items: Sequence[Item], empty_text: str = "", keep_scroll: bool = False) -> None:
+        """Заменить содержимое списка"""
+        self._items = list(items)
+        self._empty_text = empty_text
+        if not keep_scroll:
+            self._offset = 0
+        if items:
+            self._message.place_forget()
+        else:
+            self.show_message(empty_text)
+        self._schedule_render()
+
+    def show_message(self, text: str, color: Optional[str] = None) -> None:
+        """Показать сообщение вместо списка (пустой результат, ошибка)"""
+        self._items = []
+        self._message.configure(text=text, text_color=color or COLORS["TEXT_SECONDARY_COLOR"])
+        self._message.place(x=0, y=8, relwidth=1.0)
+        self._schedule_render()
+
+    @property
+    def items(self) -> Sequence[Item]:
+        """Текущие элементы списка"""
+        return self._items
+
+    def insert_item(self, item: Item) -> None:
+        """Вставить элемент на его место по алфавиту
+
+        Если строка этого сервиса уже есть (изменение пришло повторно),
+        она заменяется.
+        """
+        index = self._find(item)
+        if index is not None:
+            self._items[index] = item
+            self._schedule_render()
+            return
+        index = self._position(item[0])
+        self._items.insert(index, item)
+        self._shift(index, 1)
+
+    def remove_item(self, item: Item) -> bool:
+        """Удалить элемент, если он есть в списке"""
+        index = self._find(item)
+        if index is None:
+            return False
+        del self._items[index]
+        self._shift(index, -1)
+        return True
+
+    def replace_item(self, old: Item, new: Item) -> None:
+        """Заменить элемент (после переименования он переезжает на новое место)"""
+        index = self._find(old)
+        if index is not None and self._position(new[0], exclude=index) == index:
+            self._items[index] = new
+            self._schedule_render()
+            return
+        self.remove_item(old)
+        self.insert_item(new)
+
+    def _position(self, service: str, exclude: Optional[int] = None) -> int:
+        """Позиция для сервиса в списке, отсортированном как get_all_credentials"""
+        key = sort_key(service)
+        low, high = 0, len(self._items)
+        while low < high:
+            middle = (low + high) // 2
+            # Позиция exclude считается пустой: так проверяется замена на месте
+            probe = middle + 1 if exclude is not None and middle >= exclude else middle
+            if probe < len(self._items) and sort_key(self._items[probe][0]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _find(self, item: Item) -> Optional[int]:
+        """Индекс строки с сервисом элемента: двоичный поиск, для неотсортированного списка - перебор"""
+        service = item[0]
+        index = self._position(service)
+        if index < len(self._items) and self._items[index][0] == service:
+            return index
+        return next((i for i, row in enumerate(self._items) if row[0] == service), None)
+
+    def _shift(self, index: int, delta: int) -> None:
+        """Учесть вставку или удаление строки index, не сдвигая видимые строки"""
+        if index * self.row_height < self._offset:
+            self._offset = max(0, self._offset + delta * self.row_height)
+        if self._items:
+            self._message.place_forget()
+        else:
+            self.show_message(self._empty_text)
+        self._schedule_render()
+
+    # Выделение
+
+    @property
+    def selected(self) -> Optional[str]:
+        """Выделенный сервис"""
+        return self._selected
+
+    def select(self, service: Optional[str]) -> None:
+        """Выделить карточку сервиса (None - снять выделение)"""
+        self._selected = service
+        for card in self._pool:
+            if card.item is not None:
+                card.set_selected(card.index is not None and card.item[0] == service)
+
+    # Отрисовка
+
+    def _schedule_render(self) -> None:
+        """Объединить несколько изменений в одну отрисовку"""
+        if not self._render_pending:
+            self._render_pending = True
+            self.after_idle(self._render)
+
+    def _viewport_height(self) -> float:
+        """Высота видимой области в единицах без масштабирования"""
+        return self.body.winfo_height() / self._get_widget_scaling()
+
+    def _max_offset(self) -> int:
+        return max(0, int(len(self._items) * self.row_height - self._viewport_height()))
+
+    def _render(self) -> None:
+        """Разместить карточки пула для текущего смещения"""
+        self._render_pending = False
+        viewport = self._viewport_height()
+        needed = math.ceil(viewport / self.row_height) + 1 + self._overscan
+        while len(self._pool) < needed:
+            self._pool.append(_Card(self, self._fonts))
+
+        self._offset = min(self._offset, self._max_offset())
+        first = max(0, self._offset // self.row_height - self._overscan // 2)
+        for k, card in enumerate(self._pool):
+            index = first + k
+            if index < len(self._items) and k < needed:
+                card.show(index, self._items[index], index * self.row_height - self._offset)
+            else:
+                card.hide()
+
+        total = len(self._items) * self.row_height
+        if total > viewport > 0:
+            self._scrollbar.grid()
+            self._scrollbar.set(self._offset / total, (self._offset + viewport) / total)
+        else:
+            self._scrollbar.grid_remove()
+
+    # Прокрутка
+
+    def bind_scroll(self, widget) -> None:
+        """Прокручивать список колесом мыши над виджетом"""
+        if sys.platform.startswith("linux"):
+            widget.bind("<Button-4>", lambda e: self.scroll_by(-self.row_height))
+            widget.bind("<Button-5>", lambda e: self.scroll_by(self.row_height))
+        else:
+            widget.bind("<MouseWheel>", self._on_mouse_wheel)
+
+    def _on_mouse_wheel(self, event) -> None:
+        if sys.platform == "darwin":
+            self.scroll_by(-event.delta * 4)
+        else:
+            self.scroll_by(-int(event.delta / 120 * self.row_height))
+
+    def scroll_by(self, pixels: int) -> None:
+        """Сместить список на заданное число пикселей"""
+        self.scroll_to(self._offset + pixels)
+
+    def scroll_to(self, offset: int) -> None:
+        """Установить смещение списка"""
+        offset = max(0, min(int(offset), self._max_offset()))
+        if offset != self._offset:
+            self._offset = offset
+            self._render()
+
+    def _on_scrollbar(self, action: str, value, unit: str = "") -> None:
+        """Команда полосы прокрутки (протокол yview)"""
+        if action == "moveto":
+            self.scroll_to(float(value) * len(self._items) * self.row_height)
+        elif action == "scroll":
+            step = self._viewport_height() if unit == "pages" else self.row_height
+            self.scroll_by(int(float(value) * step))
+
+    def on_card_click(self, card: _Card) -> None:
+        """Передать выбор сервиса владельцу списка"""
+        if card.item is not None:
+            self._on_select(card.item[0])